@@ -2,8 +2,9 @@ from flask import Flask, jsonify, request
 import os
 import logging
 from logging.handlers import RotatingFileHandler
+import multiprocessing
 import tempfile
-import shutil
+import threading
 
 def create_app():
     app = Flask(__name__)
@@ -15,6 +16,15 @@ def create_app():
     # Increase timeout for large file operations (if using a WSGI server like gunicorn, set timeout there)
     app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
     
+    # Parse uploaded files into memory-spooled buffers instead of disk temp files
+    from app.utils.upload_request import SpooledUploadRequest
+    app.request_class = SpooledUploadRequest
+    
+    # Encode jsonify() responses with orjson when installed (progress polling is the hot path)
+    from app.utils.json_provider import OrjsonProvider, orjson
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    
     # Handle static folder safely
     static_folder = app.static_folder or os.path.join(app.root_path, 'static')
     app.config['UPLOAD_FOLDER'] = os.path.join(static_folder, 'uploads')
@@ -24,11 +34,17 @@ def create_app():
     # Ensure directories exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
+    # Resolved once here; download_file compares against it on every request
+    app.config['DOWNLOAD_FOLDER_REAL'] = os.path.realpath(app.config['DOWNLOAD_FOLDER'])
+    
+    # A multiprocessing child (e.g. a DOCX pool worker re-importing the launcher script) must not
+    # open the log file or start LibreOffice a second time
+    is_worker_process = multiprocessing.parent_process() is not None
     
     # Setup logging (always on; avoid rotate failures on Windows by using delay=True)
     if not os.path.exists('logs'):
         os.mkdir('logs')
-    if not app.logger.handlers:
+    if not app.logger.handlers and not is_worker_process:
         file_handler = RotatingFileHandler(
             'logs/wordtopdf.log',
             maxBytes=1024 * 1024,
@@ -43,6 +59,20 @@ def create_app():
         app.logger.setLevel(logging.INFO)
     app.logger.info('Word to PDF Converter startup')
     
+    if not is_worker_process:
+        from app.utils.libreoffice_helper import get_soffice_path, is_soffice_available, warm_up_profiles
+        if not is_soffice_available():
+            app.logger.warning(f'LibreOffice executable not found ({get_soffice_path()}); PDF conversion will fail')
+        else:
+            # Build LibreOffice profiles in the background so the first conversion starts warm
+            warm_profiles = int(os.environ.get('LIBREOFFICE_WARM_PROFILES', os.cpu_count() or 1))
+            threading.Thread(target=warm_up_profiles, args=(warm_profiles,), daemon=True).start()
+
+            from app.utils.lo_server import is_server_enabled, start_server
+            if is_server_enabled():
+                # Keep warm soffice instances running (LIBREOFFICE_SERVER=1) so conversions skip process start-up
+                threading.Thread(target=start_server, daemon=True).start()
+    
     # Global error handlers - ensure all errors return JSON
     @app.errorhandler(413)
     def too_large(e):
@@ -1,7 +1,6 @@
 from flask import Blueprint, render_template, request, jsonify, send_file, current_app
 import os
 import uuid
-import re
 from werkzeug.utils import secure_filename
 from app.utils.word_processor import WordProcessor, OrdinalDateValue
 from app.utils.validators import FileValidator
@@ -12,39 +11,51 @@ from app.utils.excel_helpers import (
     count_skipped_training_rows,
     find_column as _find_column_name,
     get_emp_code_from_row,
+    find_emp_code_columns,
+    find_trainee_address_columns,
     is_completed_status,
     is_trainee_designation,
     is_training_workbook as is_training_excel,
+    read_workbook_rows,
     sanitize_person_name,
     validate_excel_upload_files,
     validate_templates_exist,
     validate_workbook_columns,
     enrich_trainee_address_lines,
+    MAX_ROWS_PER_SHEET,
 )
 from app.template_config import (
     BANGALORE_TEMPLATE_NAME,
     JAIPUR_TEMPLATE_NAME,
     SAMPLE_FILES,
-    SAMPLES_DIR,
     TRAINEE_TEMPLATE_NAME,
     TRAINING_TEMPLATE_NAME,
+    sample_exists,
     sample_path,
 )
-import io
-import zipfile
-import tempfile
-import shutil
+import stat
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import functools
 from app.utils.libreoffice_helper import convert_docx_files_to_pdf
 from app.utils.error_handler import ErrorHandler
+from app.utils.conversion_slots import create_conversion_slots
+from app.utils.zip_stream import zip_response
+from app.utils.dir_watch import DirectoryWatcher
+from app.utils.work_dirs import make_work_dir
+from app.utils.docx_pool import get_docx_pool, discard_docx_pool, docx_chunksize
 from datetime import datetime
 import threading
 import time
+import queue
+import logging
+from collections import deque
 
 main = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {'xlsx'}  # Only Excel files allowed
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
 
 # Progress tracking per conversion (supports concurrent users)
 conversion_progress_store = {}
@@ -64,7 +75,7 @@ conversion_progress = {
     'eta_seconds': None,
     'start_time': None,
     'elapsed_time': 0,
-    'files': [],  # List of file statuses
+    'files': {},  # File statuses keyed by name; /progress returns them as a list
     'display_total': 0,  # Actual number of files/records to display to user
     'display_current': 0,  # Current progress mapped to display_total scale
     'conversion_id': None,
@@ -72,12 +83,43 @@ conversion_progress = {
     'summary': [],
 }
 
+# Fields written by _apply_progress; published together so readers need no lock
+PROGRESS_PUBLISHED_FIELDS = (
+    'start_time', 'current', 'total', 'message', 'status', 'display_total',
+    'percentage', 'elapsed_time', 'display_current', 'eta_seconds', 'files',
+)
+
+# Progress updates are queued by workers and applied by one aggregator thread,
+# coalesced to at most one write per PROGRESS_FLUSH_INTERVAL
+PROGRESS_FLUSH_INTERVAL = 0.1
+PROGRESS_FLUSH_WAIT_SECONDS = 5
+_progress_events = queue.SimpleQueue()
+_progress_aggregator_thread = None
+_progress_aggregator_lock = threading.Lock()
+
+# Rolling window of per-record durations used for the ETA, keyed by conversion_id
+ETA_WINDOW_SIZE = 32
+ETA_MAX_SECONDS = 7200
+_eta_windows = {}
+
 MAX_CONCURRENT_CONVERSIONS = int(os.environ.get('MAX_CONCURRENT_CONVERSIONS', '2'))
-conversion_semaphore = threading.Semaphore(MAX_CONCURRENT_CONVERSIONS)
+conversion_slots = create_conversion_slots(MAX_CONCURRENT_CONVERSIONS)
+# soffice processes per upload; each converts a shard of the documents
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 2))
 _semaphore_acquisition_time = {}
 _semaphore_lock = threading.Lock()
+# Slots held longer than this are logged as possibly stuck by the janitor thread
+SEMAPHORE_STUCK_SECONDS = 600
+SEMAPHORE_JANITOR_INTERVAL = 60
+_semaphore_janitor_thread = None
+
 RATE_LIMIT_REQUESTS = int(os.environ.get('RATE_LIMIT_REQUESTS', '30'))
 RATE_LIMIT_WINDOW_SECONDS = int(os.environ.get('RATE_LIMIT_WINDOW_SECONDS', '300'))
+# /health answers from the last LibreOffice probe; a background thread re-runs it this often
+HEALTH_REFRESH_SECONDS = int(os.environ.get('HEALTH_REFRESH_SECONDS', '30'))
+_libreoffice_health = None
+_health_thread = None
+_health_lock = threading.Lock()
 
 
 def _prune_progress_store():
@@ -89,6 +131,7 @@ def _prune_progress_store():
     )
     for cid in oldest_ids[: len(conversion_progress_store) - MAX_STORED_CONVERSIONS]:
         conversion_progress_store.pop(cid, None)
+        _discard_eta_window(cid)
 
 
 def _bind_progress_state(state):
@@ -107,7 +150,7 @@ def _create_progress_state(conversion_id):
         'eta_seconds': None,
         'start_time': time.time(),
         'elapsed_time': 0,
-        'files': [],
+        'files': {},
         'display_total': 0,
         'display_current': 0,
         'conversion_id': conversion_id,
@@ -132,8 +175,32 @@ def _parse_conversion_id(value):
 
 
 def _is_cancelled():
-    with conversion_progress_lock:
-        return bool(conversion_progress.get('cancel_requested'))
+    # Single dict read; no lock needed
+    return bool(conversion_progress.get('cancel_requested'))
+
+
+def _ensure_semaphore_janitor():
+    global _semaphore_janitor_thread
+    with _semaphore_lock:
+        # Started lazily so each forked gunicorn worker runs its own
+        if _semaphore_janitor_thread is None or not _semaphore_janitor_thread.is_alive():
+            _semaphore_janitor_thread = threading.Thread(
+                target=_run_semaphore_janitor, name='semaphore-janitor', daemon=True
+            )
+            _semaphore_janitor_thread.start()
+
+
+def _run_semaphore_janitor():
+    """Log conversion slots held suspiciously long; kept off the 503 path so rejections stay O(1)."""
+    while True:
+        time.sleep(SEMAPHORE_JANITOR_INTERVAL)
+        with _semaphore_lock:
+            cutoff = time.time() - SEMAPHORE_STUCK_SECONDS
+            stuck_requests = [req_id for req_id, acquire_time in _semaphore_acquisition_time.items()
+                              if acquire_time < cutoff]
+        if stuck_requests:
+            # Don't auto-release, but log for monitoring
+            logger.warning(f'Detected potentially stuck semaphore acquisitions: {stuck_requests}')
 
 
 def _check_rate_limit():
@@ -164,7 +231,7 @@ def reset_progress():
             'eta_seconds': None,
             'start_time': None,
             'elapsed_time': 0,
-            'files': [],
+            'files': {},
             'display_total': 0,  # CRITICAL: Reset to 0 so new conversion sets correct value
             'display_current': 0,  # CRITICAL: Reset to 0 so new conversion starts fresh
             'conversion_id': None  # Reset conversion ID
@@ -172,125 +239,231 @@ def reset_progress():
 
 def set_progress_status(status, error=None, eta_seconds=None):
     """Set conversion progress status - thread-safe helper"""
-    global conversion_progress
+    state = conversion_progress
+    # Status transitions must not be overtaken by a coalesced update still in flight
+    _flush_progress(state)
     with conversion_progress_lock:
-        conversion_progress['status'] = status
+        state['status'] = status
         if error is not None:
-            conversion_progress['error'] = error
+            state['error'] = error
         if eta_seconds is not None:
-            conversion_progress['eta_seconds'] = eta_seconds
+            state['eta_seconds'] = eta_seconds
+    if status != 'converting':
+        _discard_eta_window(state.get('conversion_id'))
 
-def update_progress(current, total, message, current_file=None, file_status=None, display_total=None):
-    """Update conversion progress - thread-safe"""
-    global conversion_progress
-    from time import time
+def update_progress(current, total, message, current_file=None, file_status=None, display_total=None,
+                    display_current=None):
+    """Record a progress update - thread-safe and non-blocking.
+
+    The update is queued for the aggregator thread, which writes it to the shared progress
+    state at most every PROGRESS_FLUSH_INTERVAL seconds; the final step of a phase is written immediately.
+    ``display_current`` raises the user-facing count when it is ahead of the step-based estimate.
+    """
+    _ensure_progress_aggregator()
+    _progress_events.put_nowait(
+        ('update', conversion_progress,
+         (current, total, message, current_file, file_status, display_total, display_current))
+    )
+
+
+def _flush_progress(state):
+    """Block until every update queued so far has been written into the shared progress dict."""
+    _ensure_progress_aggregator()
+    done = threading.Event()
+    _progress_events.put_nowait(('flush', state, done))
+    if not done.wait(PROGRESS_FLUSH_WAIT_SECONDS):
+        logger.warning('Timed out waiting for progress updates to flush')
+
+
+def _ensure_progress_aggregator():
+    global _progress_aggregator_thread
+    thread = _progress_aggregator_thread
+    if thread is not None and thread.is_alive():
+        return
+    with _progress_aggregator_lock:
+        # is_alive() is also False in a forked worker, which needs its own thread
+        if _progress_aggregator_thread is None or not _progress_aggregator_thread.is_alive():
+            _progress_aggregator_thread = threading.Thread(
+                target=_run_progress_aggregator, name='progress-aggregator', daemon=True
+            )
+            _progress_aggregator_thread.start()
+
+
+def _run_progress_aggregator():
+    """Drain _progress_events; the only thread that applies queued progress updates."""
+    pending = {}
+    last_flush = 0.0
+    while True:
+        timeout = max(0.0, last_flush + PROGRESS_FLUSH_INTERVAL - time.monotonic()) if pending else None
+        try:
+            kind, state, payload = _progress_events.get(timeout=timeout)
+        except queue.Empty:
+            kind = None
+        flush_now = kind is None or kind == 'flush'
+        if kind == 'update':
+            current, total, message, current_file, file_status, display_total, display_current = payload
+            entry = pending.setdefault(id(state), {
+                'state': state, 'update': None, 'display_total': None, 'display_current': 0, 'files': {},
+            })
+            entry['update'] = (current, total, message)
+            if display_total is not None:
+                entry['display_total'] = display_total
+            if display_current is not None:
+                entry['display_current'] = max(entry['display_current'], display_current)
+            if current_file and file_status:
+                entry['files'][current_file] = (file_status, current)
+            flush_now = current >= total or time.monotonic() - last_flush >= PROGRESS_FLUSH_INTERVAL
+        if flush_now and pending:
+            try:
+                with conversion_progress_lock:
+                    for entry in pending.values():
+                        current, total, message = entry['update']
+                        _apply_progress(
+                            entry['state'], current, total, message, entry['files'], entry['display_total'],
+                            entry['display_current'],
+                        )
+            except Exception as e:
+                logger.error(f'Error applying progress update: {e}', exc_info=True)
+            pending.clear()
+            last_flush = time.monotonic()
+        if kind == 'flush':
+            payload.set()
+
+
+def _discard_eta_window(conversion_id):
+    _eta_windows.pop(conversion_id, None)
+
+
+class _EtaWindow:
+    """Moving average of seconds per record over the last ETA_WINDOW_SIZE records."""
+
+    def __init__(self, start_time):
+        self.samples = deque(maxlen=ETA_WINDOW_SIZE)
+        self.reset(start_time)
+
+    def reset(self, start_time):
+        self.samples.clear()
+        self.total = 0.0
+        self.last_time = start_time
+        self.last_count = 0
+
+    def record(self, count, now):
+        if count < self.last_count:
+            self.reset(now)
+        if count <= self.last_count:
+            return
+        per_record = (now - self.last_time) / (count - self.last_count)
+        for _ in range(min(count - self.last_count, ETA_WINDOW_SIZE)):
+            if len(self.samples) == self.samples.maxlen:
+                self.total -= self.samples[0]
+            self.samples.append(per_record)
+            self.total += per_record
+        self.last_time = now
+        self.last_count = count
+
+    def average(self):
+        return self.total / len(self.samples) if self.samples else None
+
+
+def _apply_progress(target, current, total, message, file_updates, display_total, display_floor=0):
+    """
+    Apply one progress update; caller must hold conversion_progress_lock.
+
+    Writers still serialize on the lock, but readers (/progress, _is_cancelled) don't take it:
+    the fields are computed on a copy and published with one dict.update, which the GIL makes
+    atomic, so a lock-free reader sees either the previous update or this one.
+    """
+    state = dict(target)
+    # Only update start_time if it's None (new conversion) or if conversion_id changed
+    # This ensures start_time is reset for new conversions
+    if state['start_time'] is None:
+        state['start_time'] = time.time()
     
-    with conversion_progress_lock:
-        # Only update start_time if it's None (new conversion) or if conversion_id changed
-        # This ensures start_time is reset for new conversions
-        if conversion_progress['start_time'] is None:
-            conversion_progress['start_time'] = time()
-        
-        conversion_progress['current'] = current
-        conversion_progress['total'] = total
-        conversion_progress['message'] = message
-        conversion_progress['status'] = 'converting'
-        # Ensure conversion_id is preserved during updates (don't overwrite it)
-        # conversion_id should only be set at the start of a new conversion
-        
-        # Set display_total (actual number of files/records to show to user)
-        # If explicitly provided, always use it (this allows resetting from previous conversion)
-        if display_total is not None:
-            conversion_progress['display_total'] = display_total
-        elif 'display_total' not in conversion_progress or conversion_progress['display_total'] == 0:
-            # Default to total if not set, but only if it's not already set to a non-zero value
-            # This prevents overwriting a valid display_total with total (which might be total_steps)
-            conversion_progress['display_total'] = total
-        # If display_total is already set to a non-zero value and display_total parameter is None,
-        # keep the existing value (don't overwrite it) - BUT this should only happen during a single conversion,
-        # not across conversions since reset_progress() sets it to 0
-        
-        # Calculate percentage based on total steps (internal tracking)
-        if total > 0:
-            conversion_progress['percentage'] = min(100, int((current / total) * 100))
-        else:
-            conversion_progress['percentage'] = 0
-        
-        # Calculate ETA based on display_total (user-facing count)
-        elapsed = time() - conversion_progress['start_time']
-        conversion_progress['elapsed_time'] = int(elapsed)
+    state['current'] = current
+    state['total'] = total
+    state['message'] = message
+    state['status'] = 'converting'
+    # Ensure conversion_id is preserved during updates (don't overwrite it)
+    # conversion_id should only be set at the start of a new conversion
+    
+    # Set display_total (actual number of files/records to show to user)
+    # If explicitly provided, always use it (this allows resetting from previous conversion)
+    if display_total is not None:
+        state['display_total'] = display_total
+    elif 'display_total' not in state or state['display_total'] == 0:
+        # Default to total if not set, but only if it's not already set to a non-zero value
+        # This prevents overwriting a valid display_total with total (which might be total_steps)
+        state['display_total'] = total
+    # If display_total is already set to a non-zero value and display_total parameter is None,
+    # keep the existing value (don't overwrite it) - BUT this should only happen during a single conversion,
+    # not across conversions since reset_progress() sets it to 0
+    
+    # Calculate percentage based on total steps (internal tracking)
+    if total > 0:
+        state['percentage'] = min(100, int((current / total) * 100))
+    else:
+        state['percentage'] = 0
+    
+    # Calculate ETA based on display_total (user-facing count)
+    elapsed = time.time() - state['start_time']
+    state['elapsed_time'] = int(elapsed)
+    
+    display_total_val = state.get('display_total', total)
+    # Calculate current display progress (for ETA calculation and frontend display)
+    if display_total_val > 0 and total > 0:
+        # Map internal progress to display progress
+        # Ensure display_current never decreases (monotonic increase)
+        calculated_display_current = min(display_total_val, int((current / total) * display_total_val))
+        existing_display_current = state.get('display_current', 0)
+        # Only update if the new value is greater than or equal to existing (prevent decreases)
+        display_current = max(existing_display_current, calculated_display_current,
+                              min(display_total_val, display_floor))
+        # Store display_current for frontend to use directly
+        state['display_current'] = display_current
         
-        display_total_val = conversion_progress.get('display_total', total)
-        # Calculate current display progress (for ETA calculation and frontend display)
-        if display_total_val > 0 and total > 0:
-            # Map internal progress to display progress
-            # Ensure display_current never decreases (monotonic increase)
-            calculated_display_current = min(display_total_val, int((current / total) * display_total_val))
-            existing_display_current = conversion_progress.get('display_current', 0)
-            # Only update if the new value is greater than or equal to existing (prevent decreases)
-            display_current = max(existing_display_current, calculated_display_current)
-            # Store display_current for frontend to use directly
-            conversion_progress['display_current'] = display_current
-            
-            # Calculate ETA only when we have meaningful progress
-            # Require at least 3 files processed for more accurate ETA calculation
-            # This prevents incorrect ETA calculations early in the process
-            if display_current > 0 and display_total_val > display_current and elapsed > 0:
-                remaining_files = display_total_val - display_current
-                
-                # Use different calculation strategies based on sample size
-                if display_current >= 3:
-                    # With 3+ samples, use direct average (more accurate)
-                    avg_time_per_file = elapsed / display_current
-                elif display_current >= 2:
-                    # With 2 samples, apply 1.5x multiplier to be more conservative
-                    avg_time_per_file = (elapsed / display_current) * 1.5
-                else:
-                    # With only 1 sample, apply 2x multiplier and use minimum 2 seconds per file
-                    # This prevents unrealistic ETAs from a single slow file
-                    avg_time_per_file = max(2, (elapsed / display_current) * 2)
-                
-                # Calculate ETA
-                estimated_eta = avg_time_per_file * remaining_files
-                
-                # Cap ETA at 2 hours (7200 seconds) to prevent unrealistic estimates
-                # This handles edge cases where early files are much slower than average
-                conversion_progress['eta_seconds'] = min(int(estimated_eta), 7200)
-            elif display_current >= display_total_val:
-                # All items completed - check if we're still processing (ZIP creation, etc.)
-                # If status is still 'converting', show a small ETA for final processing
-                if conversion_progress.get('status') == 'converting':
-                    # Estimate 5-10 seconds for ZIP creation and finalization
-                    conversion_progress['eta_seconds'] = 5
-                else:
-                    # Fully completed
-                    conversion_progress['eta_seconds'] = 0
+        window = _eta_windows.get(state.get('conversion_id'))
+        if window is None:
+            window = _eta_windows[state.get('conversion_id')] = _EtaWindow(state['start_time'])
+        window.record(display_current, state['start_time'] + elapsed)
+
+        if display_current > 0 and display_total_val > display_current and elapsed > 0:
+            avg_time_per_file = window.average()
+            remaining_files = display_total_val - display_current
+            state['eta_seconds'] = (
+                min(int(avg_time_per_file * remaining_files), ETA_MAX_SECONDS)
+                if avg_time_per_file is not None else None
+            )
+        elif display_current >= display_total_val:
+            if current < total:
+                # Every record is prepared but later phases (PDF conversion) are still running;
+                # extrapolate from the step counter. The ZIP itself is streamed, so it adds no wait.
+                state['eta_seconds'] = (
+                    min(int(elapsed * (total - current) / current), ETA_MAX_SECONDS) if current > 0 else None
+                )
             else:
-                conversion_progress['eta_seconds'] = None
+                state['eta_seconds'] = 0
         else:
-            conversion_progress['display_current'] = 0
-            conversion_progress['eta_seconds'] = None
-        
-        # Update file status
-        if current_file and file_status:
-            # Find or create file entry
-            file_found = False
-            for file_entry in conversion_progress['files']:
-                if file_entry.get('name') == current_file:
-                    file_entry['status'] = file_status
-                    file_entry['progress'] = current
-                    file_found = True
-                    break
-            
-            if not file_found:
-                conversion_progress['files'].append({
-                    'name': current_file,
-                    'status': file_status,
-                    'progress': current
-                })
+            state['eta_seconds'] = None
+    else:
+        state['display_current'] = 0
+        state['eta_seconds'] = None
+    
+    # Update file status on a new dict, published with the rest, so /progress never copies
+    # the one being written to
+    if file_updates:
+        files = dict(state['files'])
+        for current_file, (file_status, file_progress) in file_updates.items():
+            files[current_file] = {
+                'name': current_file,
+                'status': file_status,
+                'progress': file_progress
+            }
+        state['files'] = files
+
+    target.update({field: state[field] for field in PROGRESS_PUBLISHED_FIELDS})
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'xlsx'
+    return bool(filename) and filename.lower().endswith(_ALLOWED_SUFFIXES)
 
 
 def enrich_gender_placeholders(data, gender_value):
@@ -318,7 +491,7 @@ def enrich_gender_placeholders(data, gender_value):
 
 def get_training_template_path():
     template_path = sample_path(TRAINING_TEMPLATE_NAME)
-    if not os.path.exists(template_path):
+    if not sample_exists(TRAINING_TEMPLATE_NAME):
         raise FileNotFoundError(f"Training template not found: {template_path}")
     return template_path
 
@@ -343,12 +516,10 @@ def get_template_path(location_value, designation_value=None):
         designation = str(designation_value).strip().lower()
         
         if is_trainee_designation(designation_value):
-            template_path = sample_path(TRAINEE_TEMPLATE_NAME)
-
-            if not os.path.exists(template_path):
-                template_path = sample_path(JAIPUR_TEMPLATE_NAME)
+            if not sample_exists(TRAINEE_TEMPLATE_NAME):
+                return sample_path(JAIPUR_TEMPLATE_NAME)
 
-            return template_path
+            return sample_path(TRAINEE_TEMPLATE_NAME)
     
     # For non-Trainee designations (Software Engineer, Junior Software Engineer, etc.)
     # Use location-based templates
@@ -366,12 +537,10 @@ def get_template_path(location_value, designation_value=None):
         # Default to Jaipur template if location is empty/None
         template_name = JAIPUR_TEMPLATE_NAME
     
-    template_path = sample_path(template_name)
+    if not sample_exists(template_name):
+        template_name = JAIPUR_TEMPLATE_NAME
 
-    if not os.path.exists(template_path):
-        template_path = sample_path(JAIPUR_TEMPLATE_NAME)
-
-    return template_path
+    return sample_path(template_name)
 
 def _ordinal_suffix(day):
     """Return st/nd/rd/th for a day of month."""
@@ -379,6 +548,17 @@ def _ordinal_suffix(day):
         return 'th'
     return {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
 
+DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%m-%d-%Y',
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+    '%d-%B-%Y',
+    '%d %B %Y',
+)
+
 def _parse_date_value(value):
     """Parse Excel/string date values into a datetime, or None if parsing fails."""
     if isinstance(value, pd.Timestamp):
@@ -393,18 +573,7 @@ def _parse_date_value(value):
     if not date_str or date_str.lower() in ['nan', 'none', '']:
         return None
 
-    date_formats = [
-        '%Y-%m-%d',
-        '%m/%d/%Y',
-        '%m-%d-%Y',
-        '%d/%m/%Y',
-        '%d-%m-%Y',
-        '%Y/%m/%d',
-        '%d-%B-%Y',
-        '%d %B %Y',
-    ]
-
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(date_str, fmt)
         except ValueError:
@@ -412,6 +581,60 @@ def _parse_date_value(value):
 
     return None
 
+ORDINAL_DATE_FIELDS = frozenset({
+    'date',
+    'start_date',
+    'end_date',
+    'start date',
+    'end date',
+    'date of joining',
+    'effective date',
+})
+
+def _parse_date_series(series):
+    """
+    Column-wise _parse_date_value: returns one datetime (or None) per cell.
+
+    Text cells are tried against DATE_FORMATS in the same order, one vectorised pass per format;
+    only cells that no format matches fall back to the per-value parser.
+    """
+    values = series.reset_index(drop=True)
+    parsed = [None] * len(values)
+    is_datetime = values.map(lambda value: isinstance(value, datetime)) & values.notna()
+    for position in values.index[is_datetime]:
+        parsed[position] = _parse_date_value(values[position])
+
+    pending = values[~is_datetime & values.notna()].astype(str).str.strip()
+    for fmt in DATE_FORMATS:
+        if pending.empty:
+            break
+        matched = pd.to_datetime(pending, format=fmt, errors='coerce')
+        found = matched.notna()
+        for position, parsed_date in matched[found].items():
+            parsed[position] = parsed_date.to_pydatetime()
+        pending = pending[~found]
+    for position, text in pending.items():
+        parsed[position] = _parse_date_value(text)
+    return parsed
+
+def _format_ordinal_date_series(series):
+    """Column-wise format_date_field for a date column; unparseable cells keep their text."""
+    parsed = _parse_date_series(series)
+    fallback = series.map(str).mask(series.isna(), '').tolist()
+    month_year_texts = {}
+    formatted = []
+    for parsed_date, text in zip(parsed, fallback):
+        if parsed_date is None:
+            formatted.append(text)
+            continue
+        # Sheets hold few distinct months, so render each month/year label once
+        key = (parsed_date.year, parsed_date.month)
+        if key not in month_year_texts:
+            month_year_texts[key] = _format_ordinal_date(parsed_date).month_year_text
+        day = parsed_date.day
+        formatted.append(OrdinalDateValue(day, _ordinal_suffix(day), month_year_texts[key]))
+    return formatted
+
 def _format_ordinal_date(parsed_date):
     """Format as 4th February' 26 (ordinal suffix applied as superscript in Word)."""
     day = parsed_date.day
@@ -425,17 +648,7 @@ def format_date_field(value, field_name):
     (ordinal suffix rendered as superscript in the PDF).
     """
     field_name_normalized = str(field_name).strip().lower()
-    ordinal_date_fields = {
-        'date',
-        'start_date',
-        'end_date',
-        'start date',
-        'end date',
-        'date of joining',
-        'effective date',
-    }
-
-    if field_name_normalized not in ordinal_date_fields:
+    if field_name_normalized not in ORDINAL_DATE_FIELDS:
         return str(value)
 
     parsed_date = _parse_date_value(value)
@@ -444,17 +657,108 @@ def format_date_field(value, field_name):
 
     return _format_ordinal_date(parsed_date)
 
-def _generate_docx_from_row(i, row, df, temp_dir, file_prefix=''):
-    """Generate one filled Word document from an Excel row."""
-    data = {}
-    for col in df.columns:
+LOCATION_COLUMN_NAMES = (
+    'Location', 'location', 'LOCATION', 'City', 'city', 'CITY',
+    'Location Name', 'location name', 'Place of Joining', 'place of joining',
+)
+DESIGNATION_COLUMN_NAMES = (
+    'Designation', 'designation', 'DESIGNATION', 'Role', 'role', 'ROLE',
+    'Job Title', 'job title',
+)
+
+def _resolve_location_column(columns):
+    """Pick the column holding the joining location (exact name, known aliases, then fuzzy)."""
+    for col in columns:
+        if col.strip().lower() == 'place of joining':
+            if col.strip() in columns:
+                return col.strip()
+            break
+    for name in LOCATION_COLUMN_NAMES:
+        if name in columns:
+            return name
+    for col in columns:
+        col_lower = col.lower()
+        if 'location' in col_lower or 'city' in col_lower or ('place' in col_lower and 'joining' in col_lower):
+            return col
+    return None
+
+def _resolve_designation_column(columns):
+    """Pick the column holding the designation (exact name, known aliases, then fuzzy)."""
+    for col in columns:
+        if col.strip().lower() == 'designation':
+            if col.strip() in columns:
+                return col.strip()
+            break
+    for name in DESIGNATION_COLUMN_NAMES:
+        if name in columns:
+            return name
+    for col in columns:
+        col_lower = col.lower()
+        if 'designation' in col_lower or ('role' in col_lower and 'title' not in col_lower):
+            return col
+    return None
+
+def _resolve_row_columns(columns):
+    """Resolve the columns the row worker reads, once per workbook."""
+    return {
+        'status': _find_column_name(columns, 'Status'),
+        'gender': _find_column_name(columns, 'Gender'),
+        'location': _resolve_location_column(columns),
+        'designation': _resolve_designation_column(columns),
+        'emp_code': find_emp_code_columns(columns),
+        'address': find_trainee_address_columns(columns),
+    }
+
+def _build_row_records(df):
+    """Format the sheet column by column and return one placeholder dict per row."""
+    formatted_columns = {}
+    for position, col in enumerate(df.columns):
         col_str = str(col)
-        value = row[col]
-        if pd.isna(value):
-            value = ''
-        data[col_str] = format_date_field(value, col_str)
+        series = df.iloc[:, position]
+        if col_str.strip().lower() in ORDINAL_DATE_FIELDS:
+            formatted_columns[col_str] = _format_ordinal_date_series(series)
+        else:
+            formatted_columns[col_str] = series.map(str).mask(series.isna(), '').tolist()
+    return [dict(zip(formatted_columns, row)) for row in zip(*formatted_columns.values())]
+
+def _template_or_default(template_name):
+    if not sample_exists(template_name):
+        template_name = JAIPUR_TEMPLATE_NAME
+    return sample_path(template_name)
+
+def _select_templates(records, row_columns, index):
+    """
+    Pick the template path and letter type for every row of an appointment workbook.
 
-    status_col = _find_column_name(df.columns, 'Status')
+    Same rules as get_template_path, applied to whole columns; template existence is
+    checked once per template instead of once per row.
+    """
+    def column_text(col):
+        if not col:
+            return pd.Series('', index=index, dtype=object)
+        return pd.Series([str(data.get(col, '')) for data in records], index=index, dtype=object)
+
+    designation = column_text(row_columns['designation'])
+    location = column_text(row_columns['location']).str.lower()
+    is_trainee = designation.str.contains(r'\btrainee\b', case=False, regex=True)
+    is_bangalore = location.str.contains('bangalore|bengaluru', regex=True)
+
+    templates = pd.Series(_template_or_default(JAIPUR_TEMPLATE_NAME), index=index, dtype=object)
+    if is_bangalore.any():
+        templates = templates.mask(is_bangalore, _template_or_default(BANGALORE_TEMPLATE_NAME))
+    if is_trainee.any():
+        templates = templates.mask(is_trainee, _template_or_default(TRAINEE_TEMPLATE_NAME))
+    letter_types = is_trainee.map({True: 'trainee', False: 'employment'})
+    return list(zip(templates.tolist(), letter_types.tolist()))
+
+def _generate_docx_from_row(i, data, columns, row_columns, temp_dir, file_prefix='', template=None):
+    """
+    Generate one filled Word document from a prebuilt row record.
+
+    ``template`` is the (template_path, letter_type) pair from _select_templates; when
+    omitted for an appointment row it is worked out from the row itself.
+    """
+    status_col = row_columns['status']
     letter_type = 'employment'
 
     if status_col is not None:
@@ -462,66 +766,24 @@ def _generate_docx_from_row(i, row, df, temp_dir, file_prefix=''):
         if not is_completed_status(status_value):
             return None
         letter_type = 'training'
-        gender_col = _find_column_name(df.columns, 'Gender')
+        gender_col = row_columns['gender']
         gender_value = data.get(gender_col, '') if gender_col else ''
         enrich_gender_placeholders(data, gender_value)
         word_template = get_training_template_path()
+    elif template is not None:
+        word_template, letter_type = template
     else:
-        location_value = None
-        for col in df.columns:
-            col_str = str(col).strip()
-            if col_str.lower() == 'place of joining':
-                location_value = data.get(col_str)
-                break
-
-        if location_value is None:
-            location_column_names = [
-                'Location', 'location', 'LOCATION', 'City', 'city', 'CITY',
-                'Location Name', 'location name', 'Place of Joining', 'place of joining',
-            ]
-            for loc_col in location_column_names:
-                if loc_col in data:
-                    location_value = data[loc_col]
-                    break
-
-        if location_value is None:
-            for col in df.columns:
-                col_lower = str(col).lower()
-                if 'location' in col_lower or 'city' in col_lower or ('place' in col_lower and 'joining' in col_lower):
-                    location_value = data.get(str(col))
-                    break
-
-        designation_value = None
-        for col in df.columns:
-            col_str = str(col).strip()
-            if col_str.lower() == 'designation':
-                designation_value = data.get(col_str)
-                break
-
-        if designation_value is None:
-            designation_column_names = [
-                'Designation', 'designation', 'DESIGNATION', 'Role', 'role', 'ROLE',
-                'Job Title', 'job title',
-            ]
-            for desig_col in designation_column_names:
-                if desig_col in data:
-                    designation_value = data[desig_col]
-                    break
-
-        if designation_value is None:
-            for col in df.columns:
-                col_lower = str(col).lower()
-                if 'designation' in col_lower or ('role' in col_lower and 'title' not in col_lower):
-                    designation_value = data.get(str(col))
-                    break
-
+        location_col = row_columns['location']
+        designation_col = row_columns['designation']
+        location_value = data.get(location_col) if location_col else None
+        designation_value = data.get(designation_col) if designation_col else None
         word_template = get_template_path(location_value, designation_value)
         letter_type = get_appointment_letter_type(designation_value)
 
-    enrich_trainee_address_lines(data, df.columns, os.path.basename(word_template))
+    enrich_trainee_address_lines(data, columns, os.path.basename(word_template), row_columns['address'])
 
     name_part = sanitize_person_name(data.get('Name', 'Candidate'))
-    emp_code = get_emp_code_from_row(row, df.columns)
+    emp_code = get_emp_code_from_row(data, columns, row_columns['emp_code'])
     safe_docx_name = FileValidator.sanitize_filename(name_part)
     if file_prefix:
         docx_name = f"{file_prefix}_{safe_docx_name}_{i + 1}.docx"
@@ -529,16 +791,66 @@ def _generate_docx_from_row(i, row, df, temp_dir, file_prefix=''):
         docx_name = f"{safe_docx_name}_{i + 1}.docx"
     docx_path = os.path.join(temp_dir, docx_name)
     WordProcessor().fill_placeholders(word_template, docx_path, data)
-    return (docx_path, letter_type, name_part, i, emp_code)
+    return (docx_path, letter_type, name_part, i, emp_code, docx_name[:-len('.docx')])
+
+def _generate_docx_row(args):
+    """Process-pool entry point: build one DOCX from a picklable row payload."""
+    i, data, columns, row_columns, temp_dir, file_prefix, template, source_name = args
+    try:
+        return _generate_docx_from_row(i, data, columns, row_columns, temp_dir, file_prefix, template)
+    except Exception as e:
+        raise Exception(f"Error processing row {i + 1} in {source_name}: {str(e)}")
+
+def _report_converted_pdfs(watcher, expected_pdfs, pdfs_found, total_steps, total_rows):
+    """on_poll hook for the PDF phase (30-90% of the steps); pdfs_found accumulates across calls."""
+    new_pdfs = watcher.wait_for_new(timeout=0) & expected_pdfs
+    if new_pdfs:
+        pdfs_found.update(new_pdfs)
+        progress_pct = 0.3 + (len(pdfs_found) / len(expected_pdfs)) * 0.6
+        update_progress(
+            int(total_steps * progress_pct), total_steps,
+            'Creating PDFs...',
+            display_total=total_rows
+        )
 
 @main.route('/')
 def index():
     return render_template('index.html')
 
 
+def _probe_libreoffice():
+    global _libreoffice_health
+    _libreoffice_health = FileValidator.validate_libreoffice_installation()
+    return _libreoffice_health
+
+
+def _run_health_refresher():
+    """Re-run the LibreOffice probe (a full soffice --version start) off the /health path."""
+    while True:
+        time.sleep(HEALTH_REFRESH_SECONDS)
+        try:
+            _probe_libreoffice()
+        except Exception as e:
+            logger.warning(f'LibreOffice health probe failed: {e}')
+
+
+def _libreoffice_health_snapshot():
+    """Last probe result; probed inline only before the first result or while LibreOffice is failing."""
+    global _health_thread
+    with _health_lock:
+        # Started lazily so each forked gunicorn worker runs its own
+        if _health_thread is None or not _health_thread.is_alive():
+            _health_thread = threading.Thread(target=_run_health_refresher, name='health-refresher', daemon=True)
+            _health_thread.start()
+    snapshot = _libreoffice_health
+    if snapshot is None or not snapshot[0]:
+        snapshot = _probe_libreoffice()
+    return snapshot
+
+
 @main.route('/health')
 def health_check():
-    libreoffice_ok, libreoffice_error = FileValidator.validate_libreoffice_installation()
+    libreoffice_ok, libreoffice_error = _libreoffice_health_snapshot()
     templates_ok, templates_error = validate_templates_exist()
     is_ready = libreoffice_ok and templates_ok
     return jsonify({
@@ -581,14 +893,17 @@ def get_progress():
     """Return conversion progress for a specific conversion_id."""
     conversion_id = request.args.get('conversion_id')
     try:
-        with conversion_progress_lock:
-            if conversion_id and conversion_id in conversion_progress_store:
-                progress_copy = conversion_progress_store[conversion_id].copy()
-            else:
-                progress_copy = conversion_progress.copy()
-            progress_copy['files'] = list(progress_copy.get('files', []))
-            progress_copy['summary'] = list(progress_copy.get('summary', []))
-        return jsonify(progress_copy)
+        # Lock-free snapshot: dict/list copies are atomic and _apply_progress publishes in one update,
+        # replacing the files dict rather than writing into it
+        state = conversion_progress_store.get(conversion_id) if conversion_id else None
+        progress_copy = (state if state is not None else conversion_progress).copy()
+        progress_copy['files'] = list(progress_copy.get('files', {}).values())
+        progress_copy['summary'] = list(progress_copy.get('summary', []))
+        # Polls between updates get a bodyless 304; the browser revalidates via If-None-Match
+        response = jsonify(progress_copy)
+        response.cache_control.no_cache = True
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         current_app.logger.error(f'Error getting progress: {e}', exc_info=True)
         return jsonify({
@@ -616,25 +931,17 @@ def upload_file():
     semaphore_acquired = False
     request_id = None
     try:
-        if not conversion_semaphore.acquire(blocking=False):
-            # Check if semaphore might be stuck (held for more than 10 minutes)
-            with _semaphore_lock:
-                current_time = time.time()
-                stuck_requests = [req_id for req_id, acquire_time in _semaphore_acquisition_time.items() 
-                                if current_time - acquire_time > 600]  # 10 minutes
-                if stuck_requests:
-                    current_app.logger.warning(f'Detected potentially stuck semaphore acquisitions: {stuck_requests}')
-                    # Don't auto-release, but log for monitoring
-            
+        request_id = str(uuid.uuid4())
+        if not conversion_slots.acquire(request_id):
             return jsonify({
                 'error': 'Server is busy processing other conversions. Please try again in a moment.'
             }), 503
         
         semaphore_acquired = True
         # Track semaphore acquisition
-        request_id = str(uuid.uuid4())
         with _semaphore_lock:
             _semaphore_acquisition_time[request_id] = time.time()
+        _ensure_semaphore_janitor()
     except Exception as e:
         current_app.logger.error(f'Error acquiring semaphore: {e}', exc_info=True)
         return jsonify({'error': 'An error occurred during conversion. Please try again.'}), 500
@@ -642,8 +949,6 @@ def upload_file():
     # Initialize variables for cleanup
     temp_dir = None
     output_dir = None
-    conversion_thread = None
-    monitor_thread = None
     
     try:
         if not _check_rate_limit():
@@ -676,8 +981,9 @@ def upload_file():
         # Excel to Word to PDF batch logic (supports one or more .xlsx files)
         if excel_files:
             try:
-                temp_dir = tempfile.mkdtemp()
-                output_dir = tempfile.mkdtemp()
+                upload_bytes = request.content_length or 0
+                temp_dir = make_work_dir(upload_bytes)
+                output_dir = make_work_dir(upload_bytes)
             except Exception as e:
                 current_app.logger.error(f'Error creating temp directories: {e}', exc_info=True)
                 return jsonify({'error': 'An error occurred while setting up conversion. Please try again.'}), 500
@@ -691,16 +997,10 @@ def upload_file():
                 workbooks = []
                 for excel_file in excel_files:
                     excel_filename = secure_filename(excel_file.filename)
-                    excel_path = os.path.join(temp_dir, f"{len(workbooks)}_{excel_filename}")
                     try:
+                        # Parse the uploaded stream directly; the workbook is never written to disk
                         excel_file.seek(0)
-                        excel_file.save(excel_path)
-                    except Exception as e:
-                        summary.add_error(f'{excel_filename}: could not be saved ({e})')
-                        continue
-
-                    try:
-                        df = pd.read_excel(excel_path)
+                        df = read_workbook_rows(excel_file.stream)
                     except Exception as e:
                         summary.add_error(f'{excel_filename}: could not be read ({e})')
                         continue
@@ -709,8 +1009,8 @@ def upload_file():
                         summary.add_error(f'{excel_filename}: file is empty')
                         continue
 
-                    if len(df) > 1000:
-                        summary.add_error(f'{excel_filename}: has more than 1000 rows')
+                    if len(df) > MAX_ROWS_PER_SHEET:
+                        summary.add_error(f'{excel_filename}: has more than {MAX_ROWS_PER_SHEET} rows')
                         continue
 
                     columns_ok, columns_error = validate_workbook_columns(df)
@@ -753,7 +1053,7 @@ def upload_file():
                     conversion_progress['message'] = (
                         f'Processing {total_rows} records from {len(workbooks)} Excel file(s)...'
                     )
-                    conversion_progress['files'] = []
+                    conversion_progress['files'] = {}
                     conversion_progress['current'] = 0
                     conversion_progress['total'] = total_steps
                     conversion_progress['percentage'] = 0
@@ -774,14 +1074,15 @@ def upload_file():
                 )
 
                 all_docx_files = []
+                last_row_update = 0.0
                 for workbook_index, (excel_filename, df, file_prefix, skipped_rows) in enumerate(workbooks, start=1):
                     if _is_cancelled():
                         raise Exception('Conversion cancelled by user.')
 
-                    if skipped_rows:
-                        for row_idx, row in df.iterrows():
-                            status_col = _find_column_name(df.columns, 'Status')
-                            if status_col and not is_completed_status(row.get(status_col)):
+                    status_col = _find_column_name(df.columns, 'Status') if skipped_rows else None
+                    if status_col:
+                        for row_idx, row in zip(df.index, df.to_dict('records')):
+                            if not is_completed_status(row.get(status_col)):
                                 name = sanitize_person_name(row.get('Name', f'Row {row_idx + 1}'))
                                 summary.add_skipped(
                                     f'{excel_filename} row {row_idx + 1} ({name}): Status not Completed'
@@ -792,55 +1093,60 @@ def upload_file():
                         if multiple_workbooks else ''
                     )
 
-                    def generate_docx(row_tuple, current_df=df, prefix=file_prefix, source_name=excel_filename):
-                        if _is_cancelled():
-                            return None
-                        i, row = row_tuple
-                        try:
-                            return _generate_docx_from_row(i, row, current_df, temp_dir, prefix)
-                        except Exception as e:
-                            raise Exception(f"Error processing row {i + 1} in {source_name}: {str(e)}")
-
-                    with ThreadPoolExecutor(max_workers=4) as executor:
-                        futures = {
-                            executor.submit(generate_docx, (i, row)): i for i, row in df.iterrows()
-                        }
-                        try:
-                            for future in as_completed(futures):
-                                if _is_cancelled():
-                                    for pending in futures:
-                                        pending.cancel()
-                                    raise Exception('Conversion cancelled by user.')
-                                result = future.result()
-                                if result is not None:
-                                    all_docx_files.append((*result, file_prefix))
-                                    if result[1] == 'training':
-                                        gender_col = _find_column_name(df.columns, 'Gender')
-                                        row_index = result[3]
-                                        gender_val = df.at[row_index, gender_col] if gender_col else ''
-                                        if not str(gender_val).strip() or str(gender_val).strip().lower() not in ('male', 'female'):
-                                            summary.add_warning(
-                                                f'{excel_filename} row {row_index + 1}: missing or invalid Gender'
-                                            )
-
-                                rows_processed = len(all_docx_files)
-                                progress_pct = rows_processed / total_rows * 0.3 if total_rows else 0
-                                current_progress = int(total_steps * progress_pct)
-                                update_progress(
-                                    current_progress, total_steps,
-                                    f'Preparing appointment letters... ({rows_processed}/{total_rows} records){workbook_label}',
-                                    display_total=total_rows
-                                )
-                                with conversion_progress_lock:
-                                    conversion_progress['display_current'] = max(
-                                        conversion_progress.get('display_current', 0),
-                                        rows_processed
-                                    )
-                        finally:
+                    records = _build_row_records(df)
+                    columns = [str(col) for col in df.columns]
+                    row_columns = _resolve_row_columns(columns)
+                    if row_columns['status'] is None:
+                        templates = _select_templates(records, row_columns, df.index)
+                    else:
+                        templates = [None] * len(records)
+
+                    executor = get_docx_pool()
+                    gender_col = _find_column_name(df.columns, 'Gender')
+                    # Rows go to the pool in chunks, one pickle round-trip per chunk instead of per row;
+                    # results come back in row order
+                    results = executor.map(
+                        _generate_docx_row,
+                        [
+                            (i, data, columns, row_columns, temp_dir, file_prefix, template, excel_filename)
+                            for i, data, template in zip(df.index, records, templates)
+                        ],
+                        chunksize=docx_chunksize(len(records)),
+                    )
+                    try:
+                        for result in results:
                             if _is_cancelled():
-                                for pending in futures:
-                                    pending.cancel()
-                                executor.shutdown(wait=False, cancel_futures=True)
+                                raise Exception('Conversion cancelled by user.')
+                            if result is not None:
+                                all_docx_files.append((*result, file_prefix))
+                                if result[1] == 'training':
+                                    row_index = result[3]
+                                    gender_val = df.at[row_index, gender_col] if gender_col else ''
+                                    if not str(gender_val).strip() or str(gender_val).strip().lower() not in ('male', 'female'):
+                                        summary.add_warning(
+                                            f'{excel_filename} row {row_index + 1}: missing or invalid Gender'
+                                        )
+
+                            rows_processed = len(all_docx_files)
+                            # The aggregator coalesces anyway; skip building updates nobody will see
+                            now = time.monotonic()
+                            if rows_processed != total_rows and now - last_row_update < PROGRESS_FLUSH_INTERVAL:
+                                continue
+                            last_row_update = now
+                            progress_pct = rows_processed / total_rows * 0.3 if total_rows else 0
+                            current_progress = int(total_steps * progress_pct)
+                            update_progress(
+                                current_progress, total_steps,
+                                f'Preparing appointment letters... ({rows_processed}/{total_rows} records){workbook_label}',
+                                display_total=total_rows,
+                                display_current=rows_processed,
+                            )
+                    except BrokenProcessPool:
+                        discard_docx_pool(executor)
+                        raise
+                    finally:
+                        # The pool outlives this upload: closing the results cancels chunks still queued
+                        results.close()
 
                 if _is_cancelled():
                     raise Exception('Conversion cancelled by user.')
@@ -853,95 +1159,59 @@ def upload_file():
 
                 try:
                     validated_files = []
-                    for docx_file, _letter_type, _name, _row_idx, _emp_code, _file_prefix in all_docx_files:
-                        if os.path.exists(docx_file) and os.path.isfile(docx_file):
-                            real_temp_path = os.path.realpath(temp_dir)
-                            real_file_path = os.path.realpath(docx_file)
-                            if real_file_path.startswith(real_temp_path):
+                    expected_pdfs = set()
+                    # Files were written by this request into its own work dir; checking the
+                    # parent directory is enough and avoids a realpath walk per file
+                    work_dir = os.path.abspath(temp_dir)
+                    for docx_file, _letter_type, _name, _row_idx, _emp_code, docx_base, _file_prefix in all_docx_files:
+                        try:
+                            is_regular_file = stat.S_ISREG(os.stat(docx_file).st_mode)
+                        except FileNotFoundError:
+                            is_regular_file = False
+                        if is_regular_file:
+                            if os.path.dirname(os.path.abspath(docx_file)) == work_dir:
                                 validated_files.append(docx_file)
+                                expected_pdfs.add(docx_base + '.pdf')
 
                     if not validated_files:
                         raise Exception("No valid files found for conversion")
 
-                    conversion_complete = threading.Event()
-                    conversion_error = [None]
-
-                    def monitor_pdf_conversion_excel():
-                        expected_pdfs = {
-                            os.path.splitext(os.path.basename(f))[0] + '.pdf': os.path.basename(f)
-                            for f in validated_files
-                        }
-                        pdfs_found = set()
-                        start_time = time.time()
-                        max_wait_time = 300
-
-                        while not conversion_complete.is_set() and (time.time() - start_time) < max_wait_time:
-                            if _is_cancelled():
-                                conversion_error[0] = Exception('Conversion cancelled by user.')
-                                conversion_complete.set()
-                                break
-                            if os.path.exists(output_dir):
-                                existing_pdfs = set(f for f in os.listdir(output_dir) if f.endswith('.pdf'))
-                                new_pdfs = existing_pdfs - pdfs_found
-
-                                for pdf_file in new_pdfs:
-                                    if pdf_file in expected_pdfs:
-                                        pdfs_found.add(pdf_file)
-                                        progress_pct = 0.3 + (len(pdfs_found) / len(expected_pdfs)) * 0.6
-                                        current_progress = int(total_steps * progress_pct)
-                                        update_progress(
-                                            current_progress, total_steps,
-                                            'Creating PDFs...',
-                                            display_total=total_rows
-                                        )
-
-                                if len(pdfs_found) == len(expected_pdfs):
-                                    break
-
-                            time.sleep(0.5)
-
-                    def run_conversion_excel():
-                        try:
-                            if _is_cancelled():
-                                raise Exception('Conversion cancelled by user.')
-                            convert_docx_files_to_pdf(
-                                validated_files,
-                                output_dir,
-                                timeout=300,
-                                should_cancel=_is_cancelled,
-                            )
-                            conversion_complete.set()
-                        except Exception as e:
-                            conversion_error[0] = e
-                            conversion_complete.set()
-
-                    conversion_thread = threading.Thread(target=run_conversion_excel, daemon=True)
-                    monitor_thread = threading.Thread(target=monitor_pdf_conversion_excel, daemon=True)
-                    conversion_thread.start()
-                    monitor_thread.start()
-                    conversion_thread.join(timeout=300)
-                    conversion_complete.set()
-                    monitor_thread.join(timeout=5)
-
-                    if conversion_error[0]:
-                        raise conversion_error[0]
+                    # Converted in this thread; progress is reported from the converter's wait loop.
+                    # Watch before converting starts so no PDF is written unseen
+                    with DirectoryWatcher(output_dir, suffix='.pdf') as pdf_watcher:
+                        convert_docx_files_to_pdf(
+                            validated_files,
+                            output_dir,
+                            timeout=300,
+                            should_cancel=_is_cancelled,
+                            max_processes=PDF_WORKERS,
+                            on_poll=functools.partial(
+                                _report_converted_pdfs, pdf_watcher, expected_pdfs, set(), total_steps, total_rows
+                            ),
+                        )
 
                 except Exception as e:
                     current_app.logger.error(f'PDF conversion error: {e}', exc_info=True)
                     raise Exception(f"PDF conversion failed: {str(e)}")
 
+                # One directory listing instead of a stat per expected PDF
+                with os.scandir(output_dir) as entries:
+                    converted_pdfs = {
+                        entry.name for entry in entries
+                        if entry.name.endswith('.pdf') and entry.is_file(follow_symlinks=False)
+                    }
                 pdfs_collected = 0
-                for docx_file, letter_type, name, row_idx, emp_code, file_prefix in all_docx_files:
-                    base = os.path.splitext(os.path.basename(docx_file))[0]
+                collect_base = total_steps * 0.9
+                collect_step = total_steps * 0.1 / total_rows if total_rows else 0
+                for _docx_file, letter_type, name, row_idx, emp_code, base, file_prefix in all_docx_files:
                     pdf_name = build_pdf_filename(letter_type, name, used_zip_names)
                     pdf_path = os.path.join(output_dir, base + '.pdf')
                     zip_entry = f"{file_prefix}/{pdf_name}" if file_prefix else pdf_name
 
-                    if os.path.exists(pdf_path):
+                    if base + '.pdf' in converted_pdfs:
                         pdf_files.append((pdf_path, zip_entry))
                         pdfs_collected += 1
-                        progress_pct = 0.9 + (pdfs_collected / total_rows) * 0.1
-                        current_progress = int(total_steps * progress_pct)
+                        current_progress = int(collect_base + pdfs_collected * collect_step)
                         update_progress(
                             current_progress, total_steps,
                             'Finalizing PDFs...',
@@ -957,39 +1227,9 @@ def upload_file():
                         errors[0] if errors else 'Please verify LibreOffice is installed and templates are valid.'
                     )
                     set_progress_status('error', error=error_message)
-                    if temp_dir and os.path.exists(temp_dir):
-                        shutil.rmtree(temp_dir)
-                    if output_dir and os.path.exists(output_dir):
-                        shutil.rmtree(output_dir)
+                    ErrorHandler.schedule_cleanup(temp_dir, output_dir)
                     return jsonify({'error': error_message, 'summary': summary.to_text()}), 500
 
-                zip_start_time = time.time()
-                update_progress(
-                    total_steps, total_steps,
-                    'All PDFs created! Creating ZIP package...',
-                    display_total=total_rows
-                )
-                estimated_zip_time = min(10, max(3, len(pdf_files) * 0.1))
-                set_progress_status('converting', eta_seconds=int(estimated_zip_time))
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
-                    if summary.has_skipped_or_warnings():
-                        zip_file.writestr('summary.txt', summary.to_text())
-                    for idx, (pdf_path, zip_entry_name) in enumerate(pdf_files):
-                        with open(pdf_path, 'rb') as pdf_file:
-                            zip_file.writestr(zip_entry_name, pdf_file.read())
-                        if (idx + 1) % 10 == 0 or idx == len(pdf_files) - 1:
-                            update_progress(
-                                total_steps, total_steps,
-                                f'Creating ZIP package... ({idx + 1}/{len(pdf_files)} files)',
-                                display_total=total_rows
-                            )
-                zip_creation_time = time.time() - zip_start_time
-                if temp_dir and os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                if output_dir and os.path.exists(output_dir):
-                    shutil.rmtree(output_dir)
-                zip_buffer.seek(0)
                 update_progress(
                     total_steps, total_steps,
                     'Successfully created all PDF appointment letters! Download starting...',
@@ -999,43 +1239,27 @@ def upload_file():
                 if time.time() - request_start_time > request_timeout:
                     current_app.logger.error(f'Request timeout before sending file: {request_id}')
                     set_progress_status('error', error='Request timeout. Please try again.')
+                    ErrorHandler.schedule_cleanup(temp_dir, output_dir)
                     return jsonify({
                         'error': 'Request timeout. The conversion took too long. Please try again with a smaller file.'
                     }), 504
 
-                try:
-                    response = send_file(
-                        zip_buffer,
-                        as_attachment=True,
-                        download_name=zip_filename,
-                        mimetype='application/zip',
-                        max_age=0,
-                        conditional=True
-                    )
-                    response.headers['X-Conversion-Id'] = new_conversion_id
-                    if summary.has_skipped_or_warnings():
-                        response.headers['X-Has-Summary'] = 'true'
-                    return response
-                except Exception as send_error:
-                    current_app.logger.error(f'Error sending file: {send_error}', exc_info=True)
-                    set_progress_status('error', error='Error sending file. Please try again.')
-                    return jsonify({'error': 'Error sending file. Please try again.'}), 500
+                summary_text = summary.to_text() if summary.has_skipped_or_warnings() else None
+                # The work dirs are deleted when the server closes the response, not when the stream
+                # ends, so a client that leaves before the first chunk does not leak them
+                response = zip_response(pdf_files, zip_filename, summary_text, cleanup_paths=(temp_dir, output_dir))
+                response.headers['X-Conversion-Id'] = new_conversion_id
+                if summary_text:
+                    response.headers['X-Has-Summary'] = 'true'
+                return response
 
             except Exception as e:
                 current_app.logger.error(f'Excel conversion error: {e}', exc_info=True)
                 error_message = str(e) or 'An error occurred during conversion. Please try again.'
                 is_cancelled = 'cancelled by user' in error_message.lower()
                 set_progress_status('error', error=error_message)
-                if temp_dir and os.path.exists(temp_dir):
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except Exception:
-                        pass
-                if output_dir and os.path.exists(output_dir):
-                    try:
-                        shutil.rmtree(output_dir)
-                    except Exception:
-                        pass
+                # Off the response path: a large batch can take seconds to delete
+                ErrorHandler.schedule_cleanup(temp_dir, output_dir)
                 status_code = 499 if is_cancelled else 500
                 return jsonify({'error': error_message}), status_code
 
@@ -1046,10 +1270,9 @@ def upload_file():
         return jsonify({'error': 'An error occurred during conversion. Please try again.'}), 500
     finally:
         if semaphore_acquired:
-            conversion_semaphore.release()
-            if request_id:
-                with _semaphore_lock:
-                    _semaphore_acquisition_time.pop(request_id, None)
+            conversion_slots.release(request_id)
+            with _semaphore_lock:
+                _semaphore_acquisition_time.pop(request_id, None)
 
 @main.route('/download/<filename>')
 def download_file(filename):
@@ -1065,11 +1288,15 @@ def download_file(filename):
         
         file_path = os.path.join(current_app.config['DOWNLOAD_FOLDER'], safe_filename)
         
-        # Additional path validation
-        real_download_path = os.path.realpath(current_app.config['DOWNLOAD_FOLDER'])
+        # Additional path validation; the download root is resolved once in create_app()
+        real_download_path = (
+            current_app.config.get('DOWNLOAD_FOLDER_REAL')
+            or os.path.realpath(current_app.config['DOWNLOAD_FOLDER'])
+        )
         real_file_path = os.path.realpath(file_path)
         
-        if not real_file_path.startswith(real_download_path):
+        # safe_filename has no separators, so the resolved file must sit directly in the root
+        if os.path.dirname(real_file_path) != real_download_path:
             return jsonify({'error': 'An error occurred during conversion. Please try again.'}), 403
         
         if not os.path.exists(file_path):
@@ -29,3 +29,23 @@ SAMPLE_FILES = [
 
 def sample_path(filename: str) -> str:
     return os.path.join(SAMPLES_DIR, filename)
+
+
+_available_samples = None
+
+
+def refresh_available_samples() -> frozenset:
+    """Rescan the samples folder; one scandir instead of a stat per template lookup."""
+    global _available_samples
+    try:
+        with os.scandir(SAMPLES_DIR) as entries:
+            _available_samples = frozenset(entry.name for entry in entries if entry.is_file())
+    except OSError:
+        _available_samples = frozenset()
+    return _available_samples
+
+
+def sample_exists(filename: str) -> bool:
+    """Whether samples/<filename> exists, from the cached listing; a miss triggers a rescan."""
+    names = _available_samples if _available_samples is not None else refresh_available_samples()
+    return filename in names or filename in refresh_available_samples()
@@ -3,6 +3,11 @@ import json
 from typing import Any, Dict, Optional
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 class ConfigManager:
     """Centralized configuration management for the application"""
     
@@ -96,14 +101,13 @@ class ConfigManager:
     
     def _load_from_file(self):
         """Load configuration from config file"""
-        config_file = Path('config.json')
-        if config_file.exists():
-            try:
-                with open(config_file, 'r') as f:
-                    file_config = json.load(f)
-                    self.config.update(file_config)
-            except (json.JSONDecodeError, IOError):
-                pass  # Keep default configuration
+        # One read of the raw bytes, parsed without decoding to str first; a missing file is the common case
+        try:
+            raw_config = Path('config.json').read_bytes()
+            file_config = orjson.loads(raw_config) if orjson is not None else json.loads(raw_config)
+        except (ValueError, IOError):
+            return  # Keep default configuration (JSONDecodeError is a ValueError for both parsers)
+        self.config.update(file_config)
     
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value"""
@@ -1,30 +1,40 @@
 import os
 import subprocess
-import tempfile
-import shutil
 import threading
 import time
 from typing import List, Dict, Tuple, Optional, Callable, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
 import logging
-import platform
-from app.utils.validators import FileValidator
+from app.utils import lo_server
 from app.utils.error_handler import ErrorHandler
+from app.utils.dir_watch import DirectoryWatcher
+from app.utils.libreoffice_helper import convert_docx_files_to_pdf, find_soffice
 
 logger = logging.getLogger(__name__)
 
 class ConversionManager:
-    """Manages document conversions with proper error handling and resource management"""
+    """
+    Manages document conversions with proper error handling and resource management
+
+    Not used by the registered blueprint: app.routes drives convert_docx_files_to_pdf and its
+    own progress store directly. This class is for scripts and tests that convert outside a request.
+    """
     
     # Timeout settings
     SINGLE_FILE_TIMEOUT = 120  # 2 minutes
     BATCH_TIMEOUT = 600  # 10 minutes
     SUBPROCESS_TIMEOUT = 60  # 1 minute
     
-    # Resource limits
-    MAX_CONCURRENT_CONVERSIONS = 4
+    # Files converted per soffice invocation (amortizes LibreOffice startup)
+    BATCH_SIZE = 25
+    
+    # Resource limits; the actual worker count is sized to the host in __init__
+    MAX_CONCURRENT_CONVERSIONS = 16
+    SOFFICE_PROCESS_MEMORY = 400 * 1024 * 1024  # rough footprint of one soffice converting a document
     MAX_MEMORY_USAGE = 500 * 1024 * 1024  # 500MB
     
+    # A LibreOffice install found on an upload is trusted for this long before looking again
+    REQUIREMENTS_CACHE_SECONDS = 60
+    
     def __init__(self):
         self.conversion_progress = {
             'status': 'idle',
@@ -37,6 +47,26 @@ class ConversionManager:
         }
         self._progress_callback = None
         self._stop_conversion = False
+        self._soffice_path = None
+        self._soffice_checked_at = 0.0
+        self._server_start_requested = False
+        self.max_workers = self._default_max_workers()
+    
+    def _default_max_workers(self) -> int:
+        """
+        Parallel soffice processes for this host: WORDTOPDF_MAX_WORKERS if set, otherwise one per
+        core, no more than available memory holds, capped at MAX_CONCURRENT_CONVERSIONS.
+        """
+        override = os.environ.get('WORDTOPDF_MAX_WORKERS')
+        if override:
+            return max(1, int(override))
+        limit = min(os.cpu_count() or 2, self.MAX_CONCURRENT_CONVERSIONS)
+        try:
+            import psutil
+            limit = min(limit, psutil.virtual_memory().available // self.SOFFICE_PROCESS_MEMORY)
+        except ImportError:
+            pass
+        return max(1, limit)
     
     def set_progress_callback(self, callback: Callable):
         """Set callback function for progress updates"""
@@ -44,12 +74,15 @@ class ConversionManager:
     
     def update_progress(self, current: int, total: int, message: str):
         """Update conversion progress"""
-        self.conversion_progress.update({
+        # Publish a new dict instead of mutating the one /progress may be serializing; the
+        # reference swap is atomic, so readers always see a consistent snapshot without a lock
+        self.conversion_progress = {
+            **self.conversion_progress,
             'current': current,
             'total': total,
             'message': message,
             'status': 'converting'
-        })
+        }
         
         if self._progress_callback:
             self._progress_callback(self.conversion_progress)
@@ -67,10 +100,14 @@ class ConversionManager:
         }
         self._stop_conversion = False
     
+    def fail(self, message: str):
+        """Mark the conversion failed; status and error are published together in one snapshot"""
+        self.conversion_progress = {**self.conversion_progress, 'status': 'error', 'error': message}
+    
     def stop_conversion(self):
         """Stop ongoing conversion"""
         self._stop_conversion = True
-        self.conversion_progress['status'] = 'stopped'
+        self.conversion_progress = {**self.conversion_progress, 'status': 'stopped'}
     
     def convert_single_file(self, file_path: str, filename: str, output_dir: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         """
@@ -91,7 +128,7 @@ class ConversionManager:
                 return None, None, "Insufficient disk space for conversion"
             
             # Get LibreOffice path
-            soffice_path = self._get_libreoffice_path()
+            soffice_path = self._cached_libreoffice_path()
             if not soffice_path:
                 return None, None, "LibreOffice not found. Please install LibreOffice."
             
@@ -100,12 +137,18 @@ class ConversionManager:
             name_part = filename.rsplit('.', 1)[0]
             pdf_name = f"{name_part}-Appointment_letter.pdf"
             
-            # Run conversion with timeout
+            self._ensure_warm_server()
+            
+            # Run conversion with timeout; soffice is started and awaited here rather than through
+            # subprocess.run, so stop_conversion() kills it within a poll instead of waiting it out
             try:
-                result = subprocess.run([
-                    soffice_path, '--headless', '--convert-to', 'pdf', 
-                    '--outdir', output_dir, file_path
-                ], check=True, capture_output=True, timeout=self.SUBPROCESS_TIMEOUT)
+                convert_docx_files_to_pdf(
+                    [file_path],
+                    output_dir,
+                    timeout=self.SUBPROCESS_TIMEOUT,
+                    should_cancel=lambda: self._stop_conversion,
+                    max_processes=1,
+                )
                 
                 # Check if output file was created
                 if not os.path.exists(output_pdf):
@@ -116,15 +159,52 @@ class ConversionManager:
             except subprocess.TimeoutExpired:
                 return None, None, f"Conversion timeout for {filename}"
             except subprocess.CalledProcessError as e:
-                return None, None, f"Conversion failed for {filename}: {e.stderr.decode()}"
+                return None, None, f"Conversion failed for {filename}: {e.stderr}"
+            except RuntimeError:
+                # Other RuntimeErrors (e.g. "can't start new thread") are failures, not a stop
+                if not self._stop_conversion:
+                    raise
+                return None, None, f"Conversion of {filename} was stopped"
                 
         except Exception as e:
             ErrorHandler.log_error(e, "single_file_conversion", {"file_path": file_path})
             return None, None, f"Conversion failed for {filename}: {str(e)}"
     
+    def _ensure_warm_server(self):
+        """
+        Start the warm instances in the background the first time a conversion finds none.
+
+        create_app() already does this at startup; this covers a script using the manager without
+        an app. The conversion that triggers the start still goes to soffice.
+        """
+        if self._server_start_requested or not lo_server.is_server_enabled():
+            return
+        self._server_start_requested = True
+        threading.Thread(target=lo_server.start_server, name='unoserver-start', daemon=True).start()
+    
+    def _collect_batch_results(self, file_paths: List[Tuple[str, str]], output_dir: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """Pair each input with its produced PDF; inputs without one become errors"""
+        successful_conversions = []
+        errors = []
+        # One listing of the output dir instead of a stat per file
+        with os.scandir(output_dir) as entries:
+            produced = {entry.name for entry in entries if entry.name.endswith('.pdf')}
+        for file_path, filename in file_paths:
+            pdf_basename = os.path.splitext(os.path.basename(file_path))[0] + '.pdf'
+            output_pdf = os.path.join(output_dir, pdf_basename)
+            if pdf_basename in produced:
+                name_part = filename.rsplit('.', 1)[0]
+                successful_conversions.append((output_pdf, f"{name_part}-Appointment_letter.pdf"))
+            else:
+                errors.append(f"{filename}: Conversion failed: Output file not created")
+        return successful_conversions, errors
+    
     def convert_batch_files(self, file_paths: List[Tuple[str, str]], output_dir: str) -> Tuple[List[Tuple[str, str]], List[str]]:
         """
-        Convert multiple files to PDF using parallel processing
+        Convert multiple files to PDF, BATCH_SIZE files per soffice call, chunks in parallel
+
+        Each chunk's time budget grows with its file count (SOFFICE_PER_FILE_TIMEOUT in
+        libreoffice_helper); PDFs are matched back to their inputs by file name.
         
         Returns:
             Tuple[successful_conversions, errors]
@@ -134,7 +214,7 @@ class ConversionManager:
         
         try:
             # Validate LibreOffice installation
-            soffice_path = self._get_libreoffice_path()
+            soffice_path = self._cached_libreoffice_path()
             if not soffice_path:
                 return [], ["LibreOffice not found. Please install LibreOffice."]
             
@@ -144,73 +224,61 @@ class ConversionManager:
             if not ErrorHandler.check_disk_space(output_dir, required_space):
                 return [], ["Insufficient disk space for batch conversion"]
             
-            # Convert files in parallel
-            with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_CONVERSIONS) as executor:
-                # Submit all conversion tasks
-                future_to_file = {
-                    executor.submit(self._convert_file_with_progress, file_path, filename, output_dir): (file_path, filename)
-                    for file_path, filename in file_paths
-                }
+            # At most BATCH_SIZE files per soffice call, but never fewer chunks than parallel slots,
+            # so 30 files run as 4 chunks of 7-8 instead of 25 + 5
+            chunk_count = min(
+                len(file_paths),
+                max(-(-len(file_paths) // self.BATCH_SIZE), self.max_workers),
+            )
+            self._ensure_warm_server()
+            
+            # Every chunk is its own soffice process, started and awaited from this thread (no worker
+            # thread blocked per chunk); a hung or failed chunk is killed and its files reported below
+            with DirectoryWatcher(output_dir, suffix='.pdf') as pdf_watcher:
+                converted = set()
                 
-                # Process completed conversions
-                for i, future in enumerate(as_completed(future_to_file, timeout=self.BATCH_TIMEOUT)):
-                    if self._stop_conversion:
-                        break
-                    
-                    file_path, filename = future_to_file[future]
-                    
-                    try:
-                        output_pdf, pdf_name, error = future.result(timeout=self.SUBPROCESS_TIMEOUT)
-                        
-                        if error:
-                            errors.append(f"{filename}: {error}")
-                        else:
-                            successful_conversions.append((output_pdf, pdf_name))
-                        
-                        # Update progress
-                        self.update_progress(i + 1, len(file_paths), f"Converted {i + 1}/{len(file_paths)} files...")
-                        
-                    except TimeoutError:
-                        errors.append(f"{filename}: Conversion timeout")
-                    except Exception as e:
-                        errors.append(f"{filename}: {str(e)}")
+                def report_progress():
+                    new_pdfs = pdf_watcher.wait_for_new(0)
+                    if new_pdfs:
+                        converted.update(new_pdfs)
+                        done = min(len(converted), len(file_paths))
+                        self.update_progress(done, len(file_paths), f"Converted {done}/{len(file_paths)} files...")
+                
+                try:
+                    convert_docx_files_to_pdf(
+                        [path for path, _ in file_paths],
+                        output_dir,
+                        timeout=self.BATCH_TIMEOUT,
+                        should_cancel=lambda: self._stop_conversion,
+                        max_processes=chunk_count,
+                        on_poll=report_progress,
+                    )
+                except subprocess.TimeoutExpired:
+                    successful_conversions, errors = self._collect_batch_results(file_paths, output_dir)
+                    return successful_conversions, errors + ["Batch conversion timeout"]
+                except RuntimeError:
+                    # Stopped by the user: keep what finished, like a batch stopped between chunks
+                    return self._collect_batch_results(file_paths, output_dir)
+                except (OSError, subprocess.SubprocessError) as e:
+                    # Every chunk failed; each file is reported below as not created
+                    logger.warning(f"Batch conversion failed: {e}")
             
-            return successful_conversions, errors
+            return self._collect_batch_results(file_paths, output_dir)
             
         except Exception as e:
             ErrorHandler.log_error(e, "batch_conversion", {"file_count": len(file_paths)})
             return [], [f"Batch conversion failed: {str(e)}"]
     
-    def _convert_file_with_progress(self, file_path: str, filename: str, output_dir: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
-        """Convert a single file with progress tracking"""
-        if self._stop_conversion:
-            return None, None, "Conversion stopped by user"
-        
-        return self.convert_single_file(file_path, filename, output_dir)
-    
     def _get_libreoffice_path(self) -> Optional[str]:
         """Get LibreOffice executable path"""
-        if platform.system() == "Windows":
-            soffice_path = r'C:\Program Files\LibreOffice\program\soffice.exe'
-            if os.path.exists(soffice_path):
-                return soffice_path
-        else:
-            # Try to find soffice in PATH
-            try:
-                result = subprocess.run(['which', 'soffice'], capture_output=True, text=True)
-                if result.returncode == 0:
-                    return 'soffice'
-            except Exception:
-                pass
-        
-        return None
+        return find_soffice()
     
     def validate_conversion_requirements(self) -> Tuple[bool, List[str]]:
         """Validate all requirements for conversion"""
         errors = []
         
         # Check LibreOffice
-        soffice_path = self._get_libreoffice_path()
+        soffice_path = self._cached_libreoffice_path()
         if not soffice_path:
             errors.append("LibreOffice not found. Please install LibreOffice.")
         
@@ -225,6 +293,15 @@ class ConversionManager:
         
         return len(errors) == 0, errors
     
+    def _cached_libreoffice_path(self) -> Optional[str]:
+        """LibreOffice path for the per-upload check; a found install is reused, a missing one rechecked"""
+        now = time.monotonic()
+        if self._soffice_path and now - self._soffice_checked_at < self.REQUIREMENTS_CACHE_SECONDS:
+            return self._soffice_path
+        self._soffice_path = self._get_libreoffice_path()
+        self._soffice_checked_at = now
+        return self._soffice_path
+    
     def cleanup_temp_files(self, *temp_dirs):
         """Clean up temporary files"""
         ErrorHandler.cleanup_temp_files(*temp_dirs)
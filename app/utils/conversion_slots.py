@@ -0,0 +1,92 @@
+"""Limit how many conversions run at once: per process, or across replicas through Redis."""
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.environ.get('REDIS_URL')
+SLOTS_KEY = os.environ.get('CONVERSION_SLOTS_KEY', 'wordtopdf:conversion_slots')
+# A crashed worker never releases its slot; leases older than this are reclaimed
+SLOT_LEASE_SECONDS = int(os.environ.get('CONVERSION_SLOT_LEASE_SECONDS', '900'))
+
+# Drop expired leases, then take a slot if one is free (ZADD+ZCARD, atomic in Redis)
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1] - ARGV[2])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class LocalConversionSlots:
+    """In-process slots; each gunicorn worker enforces its own limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = threading.Semaphore(limit)
+
+    def acquire(self, token):
+        return self._semaphore.acquire(blocking=False)
+
+    def release(self, token):
+        self._semaphore.release()
+
+
+class RedisConversionSlots:
+    """
+    Slots shared by every worker and replica using the same Redis key.
+
+    If Redis is unreachable the request falls back to this process's local slots.
+    """
+
+    def __init__(self, limit, url):
+        self.limit = limit
+        self._client = redis.Redis.from_url(url)
+        self._acquire = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._local = LocalConversionSlots(limit)
+        self._local_tokens = set()
+        self._lock = threading.Lock()
+
+    def acquire(self, token):
+        try:
+            return bool(self._acquire(
+                keys=[SLOTS_KEY],
+                args=[time.time(), SLOT_LEASE_SECONDS, self.limit, token],
+            ))
+        except redis.RedisError as e:
+            logger.warning(f'Redis unavailable for conversion slots, using local limit: {e}')
+        if not self._local.acquire(token):
+            return False
+        with self._lock:
+            self._local_tokens.add(token)
+        return True
+
+    def release(self, token):
+        with self._lock:
+            if token in self._local_tokens:
+                self._local_tokens.discard(token)
+                self._local.release(token)
+                return
+        try:
+            self._client.zrem(SLOTS_KEY, token)
+        except redis.RedisError as e:
+            logger.warning(f'Could not release conversion slot {token}; lease will expire: {e}')
+
+
+def create_conversion_slots(limit):
+    """Redis-backed slots when REDIS_URL is set and redis is installed, local slots otherwise."""
+    if REDIS_URL:
+        if redis is not None:
+            return RedisConversionSlots(limit, REDIS_URL)
+        logger.warning('REDIS_URL is set but redis is not installed, limiting conversions per process')
+    return LocalConversionSlots(limit)
@@ -0,0 +1,79 @@
+"""Report files as they appear in a directory: inotify on Linux, polling elsewhere."""
+import logging
+import os
+import time
+from typing import Set
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryWatcher:
+    """
+    Yield names of finished files with a given suffix as they land in ``path``.
+
+    With inotify, CLOSE_WRITE/MOVED_TO events wake the caller as soon as a file is
+    complete and no directory listing is needed. Without it (inotify_simple missing,
+    or not on Linux) the directory is rescanned every ``poll_interval`` seconds.
+    Create the watcher before the writer starts so no file is missed.
+    """
+
+    def __init__(self, path: str, suffix: str = '.pdf', poll_interval: float = 0.5):
+        self.path = path
+        self.suffix = suffix
+        self.poll_interval = poll_interval
+        self._seen: Set[str] = set()
+        self._last_scan = 0.0
+        self._inotify = None
+        if INotify is not None:
+            try:
+                self._inotify = INotify()
+                self._inotify.add_watch(path, flags.CLOSE_WRITE | flags.MOVED_TO)
+            except OSError as e:
+                logger.warning(f'inotify unavailable for {path}, polling instead: {e}')
+                self.close()
+
+    def wait_for_new(self, timeout: float) -> Set[str]:
+        """Names that appeared since the last call; waits up to ``timeout`` seconds for one."""
+        if self._inotify is not None:
+            events = self._inotify.read(timeout=int(timeout * 1000))
+            names = {event.name for event in events if event.name.endswith(self.suffix)}
+        elif timeout <= 0 and time.monotonic() - self._last_scan < self.poll_interval:
+            # Non-blocking callers may ask often; keep directory scans to one per poll_interval
+            return set()
+        else:
+            names = self._scan_new()
+            if not names and timeout > 0:
+                time.sleep(min(timeout, self.poll_interval))
+                names = self._scan_new()
+        names -= self._seen
+        self._seen |= names
+        return names
+
+    def _scan_new(self) -> Set[str]:
+        """Matching names not reported yet; seen names are skipped before any stat."""
+        self._last_scan = time.monotonic()
+        seen = self._seen
+        try:
+            with os.scandir(self.path) as entries:
+                return {
+                    entry.name for entry in entries
+                    if entry.name not in seen and entry.name.endswith(self.suffix) and entry.is_file()
+                }
+        except FileNotFoundError:
+            return set()
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
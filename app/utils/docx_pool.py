@@ -0,0 +1,55 @@
+"""Process pool shared by the upload routes for DOCX generation."""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Persistent process pool for DOCX generation, shared by concurrent uploads in this worker
+DOCX_WORKERS = int(os.environ.get('DOCX_WORKERS', os.cpu_count() or 1))
+DOCX_CHUNK_SIZE = 32
+
+_docx_pool = None
+_docx_pool_lock = threading.Lock()
+
+
+def get_docx_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for DOCX generation; python-docx is pure Python and holds the GIL.
+
+    Created on first use and kept for the life of the worker, so process start-up and the
+    per-process template cache are paid once. Uses forkserver where available so workers are
+    not forked from a multi-threaded server process.
+    """
+    global _docx_pool
+    with _docx_pool_lock:
+        if _docx_pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['app.routes'])
+            else:
+                context = multiprocessing.get_context()
+            _docx_pool = ProcessPoolExecutor(max_workers=DOCX_WORKERS, mp_context=context)
+        return _docx_pool
+
+
+def docx_chunksize(row_count: int) -> int:
+    """Rows per pool task: large enough to amortize pickling, small enough to keep every worker busy."""
+    return max(1, min(DOCX_CHUNK_SIZE, row_count // (DOCX_WORKERS * 4)))
+
+
+def discard_docx_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next upload starts a fresh one."""
+    global _docx_pool
+    with _docx_pool_lock:
+        if _docx_pool is pool:
+            _docx_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _shutdown_docx_pool() -> None:
+    if _docx_pool is not None:
+        _docx_pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_shutdown_docx_pool)
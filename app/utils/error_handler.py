@@ -1,54 +1,116 @@
+import atexit
 import logging
-import traceback
-import tempfile
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import shutil
 from typing import Dict, Any, Optional
 from flask import current_app
 import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+# Background workers for deleting temp files after the response has been sent
+_CLEANUP_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cleanup')
+
 class ErrorHandler:
     """Comprehensive error handling and logging for the application"""
     
+    # Writes queued log records to the file and console handlers (see setup_logging)
+    _listener = None
+    
     @staticmethod
     def setup_logging():
-        """Setup logging configuration"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('app.log'),
-                logging.StreamHandler()
-            ]
-        )
+        """
+        Setup logging configuration
+
+        Loggers only enqueue records; a QueueListener thread does the file and console
+        writes, so conversion threads never block on log I/O or on each other's writes.
+        """
+        root = logging.getLogger()
+        if root.handlers:
+            return  # Already configured, as basicConfig would leave it
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [logging.FileHandler('app.log'), logging.StreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = queue.SimpleQueue()
+        root.setLevel(logging.INFO)
+        root.addHandler(QueueHandler(log_queue))
+        ErrorHandler._listener = QueueListener(log_queue, *handlers)
+        ErrorHandler._listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(ErrorHandler._listener.stop)
     
     @staticmethod
     def log_error(error: Exception, context: str = "", extra_data: Optional[Dict[str, Any]] = None):
         """Log error with context and extra data"""
+        if not logger.isEnabledFor(logging.ERROR):
+            return
         error_msg = f"Error in {context}: {str(error)}"
         if extra_data:
             error_msg += f" | Extra data: {extra_data}"
         
-        logger.error(error_msg)
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        # The traceback is taken from the exception itself and only formatted by handlers that emit
+        logger.error(error_msg, exc_info=error)
     
     @staticmethod
     def cleanup_temp_files(*temp_dirs):
-        """Clean up temporary directories safely"""
+        """
+        Clean up temporary directories safely
+
+        Each directory is renamed out of the way (atomic on the same filesystem) and deleted
+        on the cleanup pool, so the caller does not wait on unlinking hundreds of PDFs.
+        """
         for temp_dir in temp_dirs:
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                    logger.info(f"Cleaned up temp directory: {temp_dir}")
-                except Exception as e:
-                    logger.error(f"Failed to clean up temp directory {temp_dir}: {e}")
+            if not temp_dir:
+                continue
+            trash_dir = f"{temp_dir.rstrip(os.sep)}.trash.{secrets.token_hex(8)}"
+            try:
+                os.rename(temp_dir, trash_dir)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                # Not renamable (permissions, busy on Windows): delete it in place as before
+                logger.warning(f"Could not move {temp_dir} aside for cleanup, deleting in place: {e}")
+                ErrorHandler._remove_path(temp_dir)
+                continue
+            _CLEANUP_POOL.submit(ErrorHandler._remove_moved_dir, temp_dir, trash_dir)
+            logger.info(f"Temp directory scheduled for cleanup: {temp_dir}")
+    
+    @staticmethod
+    def _remove_moved_dir(temp_dir, trash_dir):
+        if ErrorHandler._remove_path(trash_dir):
+            logger.info(f"Cleaned up temp directory: {temp_dir}")
+    
+    @staticmethod
+    def _remove_path(path) -> bool:
+        """Delete a file or directory tree; False (and logged) when it could not be removed"""
+        try:
+            try:
+                shutil.rmtree(path)
+            except NotADirectoryError:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to clean up {path}: {e}")
+            return False
+        return True
+    
+    @staticmethod
+    def schedule_cleanup(*paths):
+        """Delete temp files/directories in the background so callers don't wait on unlink"""
+        for path in paths:
+            if path:
+                _CLEANUP_POOL.submit(ErrorHandler._remove_path, path)
     
     @staticmethod
     def handle_conversion_error(error: Exception, temp_dirs: list, user_message: str = "Conversion failed") -> Dict[str, Any]:
         """Handle conversion errors with cleanup and logging"""
         ErrorHandler.log_error(error, "conversion", {"temp_dirs": temp_dirs})
-        ErrorHandler.cleanup_temp_files(*temp_dirs)
+        ErrorHandler.schedule_cleanup(*temp_dirs)
         
         return {
             "error": user_message,
@@ -61,11 +123,13 @@ class ErrorHandler:
         ErrorHandler.log_error(error, "file_processing", {"file_path": file_path})
         
         # Clean up the problematic file
-        if file_path and os.path.exists(file_path):
+        if file_path:
             try:
                 os.remove(file_path)
                 logger.info(f"Cleaned up problematic file: {file_path}")
-            except Exception as e:
+            except FileNotFoundError:
+                pass
+            except OSError as e:
                 logger.error(f"Failed to clean up file {file_path}: {e}")
         
         return {
@@ -177,10 +241,9 @@ class ErrorHandler:
     def check_disk_space(path: str, required_bytes: int) -> bool:
         """Check if there's enough disk space"""
         try:
-            stat = os.statvfs(path)
-            free_bytes = stat.f_frsize * stat.f_bavail
-            return free_bytes >= required_bytes
-        except Exception as e:
+            # Portable, unlike os.statvfs, which is missing on Windows and made this always pass there
+            return shutil.disk_usage(path).free >= required_bytes
+        except OSError as e:
             logger.warning(f"Could not check disk space: {e}")
             return True  # Assume OK if we can't check
     
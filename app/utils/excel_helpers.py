@@ -19,6 +19,9 @@ TRAINING_AGREEMENT_TRAINEE_ADDRESS_PLACEHOLDERS = (
     'Trainee Address line 3',
 )
 
+TRAINEE_ADDRESS_COLUMNS = ('Trainee Address 1', 'Trainee Address 2', 'Trainee Address 3')
+EMP_CODE_COLUMNS = ('EmpCode', 'Employee Code', 'Emp Code', 'Employee ID')
+
 MAX_EXCEL_FILES = 20
 MAX_ROWS_PER_SHEET = 1000
 
@@ -30,6 +33,10 @@ APPOINTMENT_OPTIONAL_COLUMNS = [
     'Trainee Address 1', 'Trainee Address 2', 'Trainee Address 3',
 ]
 
+# Both run once per row, so compile/build them once
+_TRAINEE_WORD_RE = re.compile(r'\btrainee\b', re.IGNORECASE)
+_INVALID_FILENAME_CHARS = str.maketrans({char: '_' for char in '<>:"/\\|?*'})
+
 
 def _string_cell_value(value) -> str:
     if value is None or (isinstance(value, float) and pd.isna(value)):
@@ -38,8 +45,16 @@ def _string_cell_value(value) -> str:
     return '' if text.lower() in ('nan', 'none') else text
 
 
-def enrich_trainee_address_lines(data: dict, columns, template_filename: str) -> None:
-    """Map Excel Trainee Address 1/2/3 columns to Word template placeholders."""
+def find_trainee_address_columns(columns) -> Tuple[Optional[str], ...]:
+    return tuple(find_column(columns, name) for name in TRAINEE_ADDRESS_COLUMNS)
+
+
+def enrich_trainee_address_lines(data: dict, columns, template_filename: str, address_columns=None) -> None:
+    """
+    Map Excel Trainee Address 1/2/3 columns to Word template placeholders.
+
+    Pass ``address_columns`` from find_trainee_address_columns to skip the column search per row.
+    """
     template_lower = os.path.basename(template_filename).lower()
     is_employment_template = template_lower in (
         JAIPUR_TEMPLATE_NAME.lower(),
@@ -56,11 +71,7 @@ def enrich_trainee_address_lines(data: dict, columns, template_filename: str) ->
         else TRAINING_AGREEMENT_TRAINEE_ADDRESS_PLACEHOLDERS
     )
 
-    excel_columns = (
-        find_column(columns, 'Trainee Address 1'),
-        find_column(columns, 'Trainee Address 2'),
-        find_column(columns, 'Trainee Address 3'),
-    )
+    excel_columns = address_columns if address_columns is not None else find_trainee_address_columns(columns)
 
     for placeholder_key, excel_col in zip(placeholder_keys, excel_columns):
         if excel_col is not None:
@@ -84,7 +95,11 @@ def is_training_workbook(columns) -> bool:
 def is_trainee_designation(designation_value) -> bool:
     if designation_value is None or (isinstance(designation_value, float) and pd.isna(designation_value)):
         return False
-    return re.search(r'\btrainee\b', str(designation_value).strip(), re.IGNORECASE) is not None
+    designation = str(designation_value).strip()
+    # Most designations don't mention trainee at all; skip the word-boundary regex for them
+    if 'trainee' not in designation.lower():
+        return False
+    return _TRAINEE_WORD_RE.search(designation) is not None
 
 
 def sanitize_person_name(name) -> str:
@@ -92,19 +107,24 @@ def sanitize_person_name(name) -> str:
     if name is None or (isinstance(name, float) and pd.isna(name)):
         return 'Candidate'
     cleaned = str(name).strip()
-    cleaned = re.sub(r'[<>:"/\\|?*]', '_', cleaned)
+    cleaned = cleaned.translate(_INVALID_FILENAME_CHARS)
     return cleaned or 'Candidate'
 
 
-def get_emp_code_from_row(row, columns) -> str:
-    for col_name in ('EmpCode', 'Employee Code', 'Emp Code', 'Employee ID'):
-        col = find_column(columns, col_name)
-        if col:
-            value = row.get(col, '')
-            if value is not None and not (isinstance(value, float) and pd.isna(value)):
-                text = str(value).strip()
-                if text:
-                    return FileValidator.sanitize_filename(text)
+def find_emp_code_columns(columns) -> List[str]:
+    """Employee-code columns present in the sheet, in lookup priority order."""
+    return [col for col in (find_column(columns, name) for name in EMP_CODE_COLUMNS) if col]
+
+
+def get_emp_code_from_row(row, columns, emp_code_columns=None) -> str:
+    if emp_code_columns is None:
+        emp_code_columns = find_emp_code_columns(columns)
+    for col in emp_code_columns:
+        value = row.get(col, '')
+        if value is not None and not (isinstance(value, float) and pd.isna(value)):
+            text = str(value).strip()
+            if text:
+                return FileValidator.sanitize_filename(text)
     return ''
 
 
@@ -114,6 +134,21 @@ def get_required_columns_for_workbook(columns) -> List[str]:
     return list(APPOINTMENT_REQUIRED_COLUMNS)
 
 
+def read_workbook_rows(excel_source) -> pd.DataFrame:
+    """
+    Read the first sheet of a path or seekable binary stream with openpyxl in read-only mode,
+    stopping one row past MAX_ROWS_PER_SHEET.
+
+    Oversized sheets are still detected (len(df) > MAX_ROWS_PER_SHEET) without materialising them.
+    """
+    return pd.read_excel(
+        excel_source,
+        engine='openpyxl',
+        nrows=MAX_ROWS_PER_SHEET + 1,
+        engine_kwargs={'read_only': True, 'data_only': True},
+    )
+
+
 def validate_workbook_columns(df: pd.DataFrame) -> Tuple[bool, str]:
     required = get_required_columns_for_workbook(df.columns)
     missing = [col for col in required if find_column(df.columns, col) is None]
@@ -258,9 +293,10 @@ def validate_excel_upload_files(files) -> Tuple[bool, str, List]:
 
 
 def validate_templates_exist() -> Tuple[bool, str]:
-    from app.template_config import ALL_TEMPLATE_NAMES, sample_path
+    from app.template_config import ALL_TEMPLATE_NAMES, refresh_available_samples
 
-    missing = [name for name in ALL_TEMPLATE_NAMES if not os.path.exists(sample_path(name))]
+    available = refresh_available_samples()
+    missing = [name for name in ALL_TEMPLATE_NAMES if name not in available]
     if missing:
         return False, f'Missing template file(s) in samples folder: {", ".join(missing)}'
     return True, ''
@@ -0,0 +1,32 @@
+"""JSON responses encoded with orjson when it is installed."""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Sorted keys and the stdlib provider's handling of dates/dataclasses, so bodies (and ETags) stay stable
+_ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    | orjson.OPT_APPEND_NEWLINE
+) if orjson is not None else 0
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    jsonify() through orjson; /progress is polled every second by every open page.
+
+    Pretty-printed debug output and values orjson rejects (non-str keys, huge ints)
+    go through the stdlib encoder as before. dumps()/loads() are unchanged.
+    """
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
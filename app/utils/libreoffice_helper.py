@@ -1,25 +1,83 @@
 """Run LibreOffice without showing a console window (Windows)."""
+import atexit
+import heapq
+import itertools
+import logging
 import os
 import platform
+import queue
+import shutil
+import signal
 import subprocess
+import tempfile
+import threading
 import time
+import xmlrpc.client
+from functools import lru_cache
+from pathlib import Path
 from typing import Callable, List, Optional
 
 WINDOWS_SOFFICE_DIR = r'C:\Program Files\LibreOffice\program'
+_IS_WINDOWS = platform.system() == 'Windows'
 
+logger = logging.getLogger(__name__)
 
+# Per-shard time budget; a shard over it is killed without failing the rest of the batch
+SOFFICE_SHARD_TIMEOUT = int(os.environ.get('SOFFICE_SHARD_TIMEOUT', '60'))
+SOFFICE_PER_FILE_TIMEOUT = int(os.environ.get('SOFFICE_PER_FILE_TIMEOUT', '30'))
+# Bytes of a failed shard's stderr kept for the error message
+SOFFICE_STDERR_LIMIT = 64 * 1024
+
+# Pin each soffice shard to one CPU (Linux, SOFFICE_PIN_CPUS=1); off by default because
+# the conversions of concurrent uploads would then compete for the same cores
+SOFFICE_PIN_CPUS = os.environ.get('SOFFICE_PIN_CPUS', '').lower() in ('1', 'true', 'yes')
+_next_cpu = itertools.count()
+
+# LibreOffice user profiles are reused between conversions; building one costs a second or more
+_profile_root = None
+_profile_count = 0
+_profile_lock = threading.Lock()
+_idle_profiles = queue.SimpleQueue()
+
+
+def _windows_soffice_dirs() -> List[str]:
+    # Honour non-default Program Files locations and 32-bit installs on 64-bit Windows
+    dirs = [
+        os.path.join(os.environ[var], 'LibreOffice', 'program')
+        for var in ('PROGRAMFILES', 'PROGRAMFILES(X86)')
+        if os.environ.get(var)
+    ]
+    if WINDOWS_SOFFICE_DIR not in dirs:
+        dirs.append(WINDOWS_SOFFICE_DIR)
+    return dirs
+
+
+def find_soffice() -> Optional[str]:
+    """Locate the soffice executable without spawning a process; None when it is not installed."""
+    if _IS_WINDOWS:
+        for directory in _windows_soffice_dirs():
+            for name in ('soffice.com', 'soffice.exe'):
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    return path
+        return None
+    return shutil.which('soffice')
+
+
+@lru_cache(maxsize=1)
 def get_soffice_path() -> str:
-    if platform.system() == 'Windows':
-        for name in ('soffice.com', 'soffice.exe'):
-            path = os.path.join(WINDOWS_SOFFICE_DIR, name)
-            if os.path.exists(path):
-                return path
-        return os.path.join(WINDOWS_SOFFICE_DIR, 'soffice.com')
-    return 'soffice'
+    """Resolve the soffice executable once per process."""
+    if _IS_WINDOWS:
+        return find_soffice() or os.path.join(WINDOWS_SOFFICE_DIR, 'soffice.com')
+    return find_soffice() or 'soffice'
+
+
+def is_soffice_available() -> bool:
+    return shutil.which(get_soffice_path()) is not None
 
 
 def _subprocess_kwargs() -> dict:
-    if platform.system() != 'Windows':
+    if not _IS_WINDOWS:
         return {}
     startupinfo = subprocess.STARTUPINFO()
     startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
@@ -38,62 +96,254 @@ def run_soffice(
     cmd = [get_soffice_path()] + args
     return subprocess.run(
         cmd,
-        capture_output=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
         timeout=timeout,
         check=check,
         **_subprocess_kwargs(),
     )
 
 
+def user_installation_arg(profile_dir: str) -> str:
+    """Point soffice at its own profile so concurrent instances don't share a lock."""
+    return '-env:UserInstallation=' + Path(profile_dir).resolve().as_uri()
+
+
+def _new_profile_dir() -> str:
+    global _profile_root, _profile_count
+    with _profile_lock:
+        if _profile_root is None:
+            _profile_root = tempfile.mkdtemp(prefix='wordtopdf_lo_profiles_')
+            atexit.register(shutil.rmtree, _profile_root, ignore_errors=True)
+        _profile_count += 1
+        return os.path.join(_profile_root, f'profile_{_profile_count}')
+
+
+def acquire_profile() -> str:
+    """Take an idle (already initialised) profile directory, or allocate a new one."""
+    try:
+        return _idle_profiles.get_nowait()
+    except queue.Empty:
+        return _new_profile_dir()
+
+
+def release_profile(profile_dir: str, reusable: bool = True) -> None:
+    """Return a profile to the pool; profiles of killed soffice processes are discarded."""
+    if reusable:
+        _idle_profiles.put(profile_dir)
+    else:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+def warm_up_profiles(count: int = 1, timeout: int = 60) -> int:
+    """Initialise ``count`` profiles ahead of the first conversion; returns how many succeeded."""
+    warmed = 0
+    for _ in range(count):
+        profile_dir = _new_profile_dir()
+        try:
+            run_soffice(
+                [user_installation_arg(profile_dir), '--headless', '--nofirststartwizard',
+                 '--terminate_after_init'],
+                timeout=timeout,
+                check=True,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f'LibreOffice profile warm-up failed: {e}')
+            release_profile(profile_dir, reusable=False)
+            break
+        release_profile(profile_dir)
+        warmed += 1
+    return warmed
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _start_soffice(cmd: List[str], stderr_file) -> subprocess.Popen:
+    """Start one soffice shard; with SOFFICE_PIN_CPUS it is pinned to the next CPU in turn."""
+    popen_kwargs = dict(
+        stdout=subprocess.DEVNULL,
+        stderr=stderr_file,
+        start_new_session=not _IS_WINDOWS,
+        **_subprocess_kwargs(),
+    )
+    if not SOFFICE_PIN_CPUS or not hasattr(os, 'sched_setaffinity'):
+        return subprocess.Popen(cmd, **popen_kwargs)
+    # The child inherits the affinity of the thread that forks it, so pin this thread around
+    # the fork; every process soffice starts afterwards stays on that CPU
+    allowed = os.sched_getaffinity(0)
+    cpus = sorted(allowed)
+    os.sched_setaffinity(0, {cpus[next(_next_cpu) % len(cpus)]})
+    try:
+        return subprocess.Popen(cmd, **popen_kwargs)
+    finally:
+        os.sched_setaffinity(0, allowed)
+
+
+def _read_stderr_tail(stderr_file) -> str:
+    stderr_file.seek(0, os.SEEK_END)
+    stderr_file.seek(max(0, stderr_file.tell() - SOFFICE_STDERR_LIMIT))
+    return stderr_file.read().decode(errors='replace')
+
+
+def _split_into_shards(paths: List[str], shard_count: int) -> List[List[str]]:
+    """
+    Balance files across shards by size (largest first onto the lightest shard).
+
+    Conversion time tracks document size, so this keeps one soffice from finishing
+    long after the others when a batch mixes short and long letters.
+    """
+    shards = [[] for _ in range(shard_count)]
+    # (bytes, file count, index): file count breaks ties so equal sizes still spread out
+    loads = [(0, 0, index) for index in range(shard_count)]
+    for size, path in sorted(((_file_size(path), path) for path in paths), reverse=True):
+        load, count, index = heapq.heappop(loads)
+        shards[index].append(path)
+        heapq.heappush(loads, (load + size, count + 1, index))
+    return shards
+
+
+def _signal_process(proc: subprocess.Popen, force: bool = False) -> None:
+    """Stop soffice and the soffice.bin it spawns; on POSIX each shard runs in its own session."""
+    if _IS_WINDOWS:
+        if force:
+            proc.kill()
+        else:
+            proc.terminate()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _stop_processes(procs: List[subprocess.Popen], grace: float = 5) -> None:
+    for proc in procs:
+        if proc.poll() is None:
+            _signal_process(proc)
+    deadline = time.time() + grace
+    for proc in procs:
+        try:
+            proc.wait(timeout=max(0, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            _signal_process(proc, force=True)
+            proc.wait()
+
+
 def convert_docx_files_to_pdf(
     docx_paths: List[str],
     output_dir: str,
     timeout: int = 300,
     should_cancel: Optional[Callable[[], bool]] = None,
+    max_processes: Optional[int] = None,
+    on_poll: Optional[Callable[[], None]] = None,
 ) -> None:
-    """Convert Word files to PDF in headless mode without a visible terminal."""
+    """Convert Word files to PDF in headless mode without a visible terminal.
+
+    When a unoserver instance is running (see lo_server) the files are sent to it.
+    Otherwise they are split across up to ``max_processes`` soffice instances
+    (defaults to the CPU count), each with an isolated user profile.
+    ``on_poll`` is called from the waiting loop, so callers can report progress
+    without a separate monitor thread.
+
+    A shard that hangs past its own time budget or fails is killed and skipped; the
+    other shards keep going and their PDFs are kept. It only raises when every shard
+    failed, when ``timeout`` expires for the whole batch, or on cancel.
+    """
     if should_cancel and should_cancel():
         raise RuntimeError('Conversion cancelled by user.')
+    if not docx_paths:
+        return
+
+    # Imported here because lo_server builds on this module
+    from app.utils import lo_server
+    if lo_server.is_server_running():
+        try:
+            lo_server.convert_with_server(docx_paths, output_dir, timeout, should_cancel, on_poll)
+            return
+        except (OSError, xmlrpc.client.Error) as e:
+            logger.warning(f'unoserver conversion failed, falling back to soffice processes: {e}')
+            docx_paths = [
+                path for path in docx_paths
+                if not os.path.exists(os.path.join(output_dir, Path(path).stem + '.pdf'))
+            ]
+            if not docx_paths:
+                return
 
+    shard_count = max(1, min(len(docx_paths), max_processes or os.cpu_count() or 1))
     args = [
         '--headless',
         '--invisible',
         '--norestore',
         '--nologo',
+        '--nofirststartwizard',
         '--convert-to',
         'pdf',
         '--outdir',
         output_dir,
-    ] + docx_paths
-    cmd = [get_soffice_path()] + args
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        **_subprocess_kwargs(),
-    )
-    deadline = time.time() + timeout
+    ]
+    profiles = []
+    commands = []
+    procs = []
+    stderr_files = []
+    shard_sizes = []
+    shard_deadlines = []
+    timed_out = set()
     try:
-        while proc.poll() is None:
+        start = time.time()
+        for shard in _split_into_shards(docx_paths, shard_count):
+            profiles.append(acquire_profile())
+            cmd = [get_soffice_path(), user_installation_arg(profiles[-1])] + args + shard
+            commands.append(cmd)
+            # stderr goes to a file, not a pipe nobody drains until exit: a chatty soffice would
+            # block once the pipe buffer filled. Only its tail is read, on failure
+            stderr_files.append(tempfile.TemporaryFile())
+            procs.append(_start_soffice(cmd, stderr_files[-1]))
+            shard_sizes.append(len(shard))
+            shard_deadlines.append(start + SOFFICE_SHARD_TIMEOUT + SOFFICE_PER_FILE_TIMEOUT * len(shard))
+
+        deadline = start + timeout
+        while any(proc.poll() is None for proc in procs):
             if should_cancel and should_cancel():
-                proc.terminate()
-                try:
-                    proc.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                    proc.wait()
+                _stop_processes(procs)
                 raise RuntimeError('Conversion cancelled by user.')
-            if time.time() > deadline:
-                proc.kill()
-                proc.wait()
-                raise subprocess.TimeoutExpired(cmd, timeout)
+            now = time.time()
+            if now > deadline:
+                _stop_processes(procs, grace=0)
+                raise subprocess.TimeoutExpired(commands[0], timeout)
+            for index, proc in enumerate(procs):
+                if index not in timed_out and now > shard_deadlines[index] and proc.poll() is None:
+                    logger.warning(f'soffice shard of {shard_sizes[index]} files hung, '
+                                   f'killing it and keeping the other shards')
+                    _stop_processes([proc], grace=0)
+                    timed_out.add(index)
+            if on_poll:
+                on_poll()
             time.sleep(0.2)
     except Exception:
-        if proc.poll() is None:
-            proc.kill()
-            proc.wait()
+        _stop_processes(procs, grace=0)
+        for profile_dir in profiles:
+            release_profile(profile_dir, reusable=False)
+        for stderr_file in stderr_files:
+            stderr_file.close()
         raise
 
-    if proc.returncode != 0:
-        stderr = (proc.stderr.read() or b'').decode(errors='replace')
-        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+    failures = []
+    for index, (cmd, proc, profile_dir) in enumerate(zip(commands, procs, profiles)):
+        failed = index in timed_out or proc.returncode != 0
+        # A killed or crashed soffice may leave its profile locked or half-written
+        release_profile(profile_dir, reusable=not failed)
+        with stderr_files[index] as stderr_file:
+            if index in timed_out:
+                failures.append(subprocess.TimeoutExpired(cmd, shard_deadlines[index] - start))
+            elif proc.returncode != 0:
+                stderr = _read_stderr_tail(stderr_file)
+                failures.append(subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr))
+    if failures and len(failures) == len(procs):
+        raise failures[0]
+    for failure in failures:
+        logger.warning(f'soffice shard failed, its files are skipped: {failure}')
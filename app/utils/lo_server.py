@@ -0,0 +1,266 @@
+"""Optional persistent LibreOffice instances driven over UNO through unoserver."""
+import atexit
+import logging
+import os
+import queue
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import xmlrpc.client
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from app.utils.libreoffice_helper import get_soffice_path, _subprocess_kwargs
+
+try:
+    import unoserver
+except ImportError:
+    unoserver = None
+
+logger = logging.getLogger(__name__)
+
+UNOSERVER_ENABLED = os.environ.get('LIBREOFFICE_SERVER', '').lower() in ('1', 'true', 'yes')
+UNOSERVER_HOST = os.environ.get('UNOSERVER_HOST', '127.0.0.1')
+UNOSERVER_PORT = int(os.environ.get('UNOSERVER_PORT', '2003'))
+UNOSERVER_UNO_PORT = int(os.environ.get('UNOSERVER_UNO_PORT', '2002'))
+UNOSERVER_START_TIMEOUT = int(os.environ.get('UNOSERVER_START_TIMEOUT', '60'))
+# A single document taking longer than this means LibreOffice is wedged; restart it
+UNOSERVER_CONVERT_TIMEOUT = int(os.environ.get('UNOSERVER_CONVERT_TIMEOUT', '60'))
+# LibreOffice slows down over long runs, so recycle it after this many documents (0 disables)
+UNOSERVER_MAX_CONVERSIONS = int(os.environ.get('UNOSERVER_MAX_CONVERSIONS', '500'))
+UNOSERVER_WATCHDOG_INTERVAL = 10
+# Warm LibreOffice instances kept running; instance k listens on UNOSERVER_PORT + 2k (XML-RPC)
+# and UNOSERVER_UNO_PORT + 2k (UNO). Each converts one document at a time.
+UNOSERVER_INSTANCES = max(1, int(os.environ.get('UNOSERVER_INSTANCES', '1')))
+# How long a conversion waits for a busy instance before leaving it to soffice processes
+UNOSERVER_ACQUIRE_TIMEOUT = float(os.environ.get('UNOSERVER_ACQUIRE_TIMEOUT', '2'))
+
+_watchdog_thread = None
+_watchdog_lock = threading.Lock()
+
+
+class ServerBusy(OSError):
+    """Every warm instance is serving another request; the caller should use soffice instead."""
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport whose socket gives up after ``timeout`` seconds."""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class _UnoInstance:
+    """One unoserver process (and its soffice) on its own pair of ports."""
+
+    def __init__(self, index):
+        self.index = index
+        self.port = UNOSERVER_PORT + 2 * index
+        self.uno_port = UNOSERVER_UNO_PORT + 2 * index
+        # Without its own profile every instance locks the shared ~/.config/libreoffice one;
+        # keyed by port so a restarted instance starts from its already initialised profile
+        self.profile_dir = os.path.join(tempfile.gettempdir(), f'wordtopdf_unoserver_profile_{self.uno_port}')
+        self.proc = None
+        self.conversions = 0
+        self.lock = threading.Lock()
+
+    def port_open(self) -> bool:
+        try:
+            with socket.create_connection((UNOSERVER_HOST, self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def start(self) -> bool:
+        """
+        Start this instance unless one is already listening on its port.
+
+        Another gunicorn worker may have started it first; in that case it is shared.
+        """
+        with self.lock:
+            if self.port_open():
+                return True
+            if self.proc is None or self.proc.poll() is not None:
+                try:
+                    self.proc = subprocess.Popen(
+                        [
+                            'unoserver',
+                            '--interface', UNOSERVER_HOST,
+                            '--port', str(self.port),
+                            '--uno-port', str(self.uno_port),
+                            '--executable', get_soffice_path(),
+                            '--user-installation', self.profile_dir,
+                        ],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                        **_subprocess_kwargs(),
+                    )
+                except OSError as e:
+                    logger.warning(f'Could not start unoserver on port {self.port}: {e}')
+                    return False
+                self.conversions = 0
+
+            deadline = time.time() + UNOSERVER_START_TIMEOUT
+            while time.time() < deadline:
+                if self.port_open():
+                    logger.info(f'unoserver listening on {UNOSERVER_HOST}:{self.port}')
+                    return True
+                if self.proc.poll() is not None:
+                    break
+                time.sleep(0.5)
+        logger.warning(f'unoserver on port {self.port} did not come up')
+        return False
+
+    def stop(self) -> None:
+        with self.lock:
+            proc, self.proc = self.proc, None
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def restart(self) -> bool:
+        """Restart an instance this process started; one owned by another worker is left alone."""
+        if self.proc is None:
+            return False
+        logger.warning(f'Restarting unoserver on port {self.port}')
+        self.stop()
+        return self.start()
+
+
+_instances = [_UnoInstance(index) for index in range(UNOSERVER_INSTANCES)]
+# Instances not serving a request; a conversion takes one and hands it back when done
+_idle_instances = queue.Queue()
+for _instance in _instances:
+    _idle_instances.put(_instance)
+
+
+def is_server_enabled() -> bool:
+    return UNOSERVER_ENABLED and unoserver is not None
+
+
+def start_server() -> bool:
+    """Start the warm unoserver instances; True when at least one is listening."""
+    if not is_server_enabled():
+        if UNOSERVER_ENABLED:
+            logger.warning('unoserver not installed, using one soffice process per conversion')
+        return False
+
+    started = [instance.start() for instance in _instances]
+    _ensure_watchdog()
+    if not any(started):
+        logger.warning('unoserver did not come up, using one soffice process per conversion')
+    return any(started)
+
+
+def stop_server() -> None:
+    for instance in _instances:
+        instance.stop()
+
+
+def restart_server() -> bool:
+    """Restart the instances this process started; False if none came back."""
+    return any([instance.restart() for instance in _instances])
+
+
+def _ensure_watchdog() -> None:
+    global _watchdog_thread
+    with _watchdog_lock:
+        if _watchdog_thread is None and any(instance.proc is not None for instance in _instances):
+            atexit.register(stop_server)
+            _watchdog_thread = threading.Thread(target=_run_watchdog, name='unoserver-watchdog', daemon=True)
+            _watchdog_thread.start()
+
+
+def _run_watchdog() -> None:
+    """Bring an instance back if it exits while the app is running."""
+    while True:
+        time.sleep(UNOSERVER_WATCHDOG_INTERVAL)
+        for instance in _instances:
+            proc = instance.proc
+            if proc is not None and proc.poll() is not None:
+                logger.warning(f'unoserver on port {instance.port} exited with code {proc.returncode}, restarting')
+                instance.start()
+
+
+def is_server_running() -> bool:
+    return is_server_enabled() and any(instance.port_open() for instance in _instances)
+
+
+def _acquire_instance(deadline: float, should_cancel: Optional[Callable[[], bool]]) -> _UnoInstance:
+    """Take an idle instance, waiting at most UNOSERVER_ACQUIRE_TIMEOUT before raising ServerBusy."""
+    give_up = min(deadline, time.time() + UNOSERVER_ACQUIRE_TIMEOUT)
+    while True:
+        if should_cancel and should_cancel():
+            raise RuntimeError('Conversion cancelled by user.')
+        if time.time() > give_up:
+            raise ServerBusy(f'all {UNOSERVER_INSTANCES} unoserver instances are busy')
+        try:
+            return _idle_instances.get(timeout=max(0.01, min(0.5, give_up - time.time())))
+        except queue.Empty:
+            continue
+
+
+def convert_with_server(
+    docx_paths: List[str],
+    output_dir: str,
+    timeout: int = 300,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_poll: Optional[Callable[[], None]] = None,
+) -> None:
+    """
+    Convert Word files to PDF on a free warm unoserver instance, one document at a time.
+
+    LibreOffice converts serially inside one instance, so files are sent in sequence
+    rather than from a thread pool; concurrent requests use different instances.
+    When none is free within UNOSERVER_ACQUIRE_TIMEOUT it raises ServerBusy (an OSError).
+    A document that stalls for UNOSERVER_CONVERT_TIMEOUT restarts the instance and
+    raises TimeoutError (an OSError) so the caller can fall back.
+    """
+    deadline = time.time() + timeout
+    instance = _acquire_instance(deadline, should_cancel)
+    try:
+        for docx_path in docx_paths:
+            if should_cancel and should_cancel():
+                raise RuntimeError('Conversion cancelled by user.')
+            if time.time() > deadline:
+                raise subprocess.TimeoutExpired('unoserver', timeout)
+            if UNOSERVER_MAX_CONVERSIONS and instance.conversions >= UNOSERVER_MAX_CONVERSIONS:
+                instance.restart()
+            pdf_path = os.path.join(output_dir, Path(docx_path).stem + '.pdf')
+            # The socket timeout ends the call itself, bounded by whichever runs out first: the
+            # per-document budget or what is left of the batch deadline. Restarting alone would
+            # not free it for an instance another worker process owns
+            batch_left = deadline - time.time()
+            try:
+                _convert_document(instance, docx_path, pdf_path, max(0.1, min(UNOSERVER_CONVERT_TIMEOUT, batch_left)))
+            except socket.timeout:
+                instance.restart()
+                if batch_left < UNOSERVER_CONVERT_TIMEOUT:
+                    raise subprocess.TimeoutExpired('unoserver', timeout)
+                raise TimeoutError(f'unoserver did not convert {os.path.basename(docx_path)} '
+                                   f'within {UNOSERVER_CONVERT_TIMEOUT}s')
+            instance.conversions += 1
+            if on_poll:
+                on_poll()
+    finally:
+        _idle_instances.put(instance)
+
+
+def _convert_document(instance: _UnoInstance, docx_path: str, pdf_path: str, timeout: float) -> None:
+    """One unoserver convert call; the server reads and writes the files itself, so paths are absolute."""
+    transport = _TimeoutTransport(timeout)
+    with xmlrpc.client.ServerProxy(f'http://{UNOSERVER_HOST}:{instance.port}', transport=transport,
+                                   allow_none=True) as proxy:
+        proxy.convert(os.path.abspath(docx_path), None, os.path.abspath(pdf_path), 'pdf')
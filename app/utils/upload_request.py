@@ -0,0 +1,16 @@
+"""Request class that keeps typical uploads in memory while they are parsed."""
+import os
+import tempfile
+
+from flask import Request
+
+# Werkzeug writes every file of a multipart body over 500 KB to a temp file on disk;
+# spooling per file keeps ordinary .docx/.xlsx uploads in RAM and only larger ones spill
+UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE', str(8 * 1024 * 1024)))
+
+
+class SpooledUploadRequest(Request):
+    """Flask request whose uploaded files are held in memory up to UPLOAD_SPOOL_MAX_SIZE each."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE, mode='rb+')
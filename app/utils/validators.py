@@ -1,6 +1,6 @@
 import os
 import pandas as pd
-from typing import List, Dict, Tuple, Optional
+from typing import List, Tuple, Optional
 from werkzeug.datastructures import FileStorage
 import logging
 import mimetypes
@@ -13,6 +13,7 @@ class FileValidator:
     # File size limits (in bytes)
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB per file
     MAX_TOTAL_SIZE = 200 * 1024 * 1024  # 200MB total
+    MAX_EXCEL_ROWS = 1000  # Reasonable limit for one batch of letters
     
     # Allowed MIME types
     ALLOWED_MIME_TYPES = {
@@ -24,6 +25,7 @@ class FileValidator:
     
     # Allowed file extensions
     ALLOWED_EXTENSIONS = {'docx', 'doc', 'xlsx', 'xls'}
+    _ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
     
     @staticmethod
     def validate_file_upload(files: List[FileStorage]) -> Tuple[bool, str, List[FileStorage]]:
@@ -89,9 +91,9 @@ class FileValidator:
     @staticmethod
     def _has_valid_extension(filename: str) -> bool:
         """Check if file has valid extension"""
-        if not filename or '.' not in filename:
+        if not filename:
             return False
-        return filename.rsplit('.', 1)[1].lower() in FileValidator.ALLOWED_EXTENSIONS
+        return filename.lower().endswith(FileValidator._ALLOWED_SUFFIXES)
     
     @staticmethod
     def validate_excel_structure(file_path: str, required_columns: Optional[List[str]] = None) -> Tuple[bool, str, Optional[pd.DataFrame]]:
@@ -115,9 +117,9 @@ class FileValidator:
             if file_size > FileValidator.MAX_FILE_SIZE:
                 return False, f"Excel file is too large ({file_size // (1024*1024)}MB). Maximum size is {FileValidator.MAX_FILE_SIZE // (1024*1024)}MB.", None
             
-            # Read Excel file
+            # Read Excel file; parsing stops one row past the limit, enough to reject an oversized sheet
             try:
-                df = pd.read_excel(file_path)
+                df = pd.read_excel(file_path, nrows=FileValidator.MAX_EXCEL_ROWS + 1)
             except Exception as e:
                 return False, f"Error reading Excel file: {str(e)}", None
             
@@ -126,8 +128,8 @@ class FileValidator:
                 return False, "Excel file is empty", None
             
             # Check if dataframe has too many rows
-            if len(df) > 1000:  # Reasonable limit
-                return False, f"Excel file has too many rows ({len(df)}). Maximum allowed is 1000.", None
+            if len(df) > FileValidator.MAX_EXCEL_ROWS:
+                return False, f"Excel file has more than {FileValidator.MAX_EXCEL_ROWS} rows. Maximum allowed is {FileValidator.MAX_EXCEL_ROWS}.", None
             
             # Check required columns if specified
             if required_columns:
@@ -210,7 +212,6 @@ class FileValidator:
             str: Sanitized filename
         """
         import re
-        from pathlib import Path
         
         # Remove path separators and other dangerous characters
         sanitized = re.sub(r'[<>:"/\\|?*]', '_', filename)
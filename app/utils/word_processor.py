@@ -1,12 +1,27 @@
 from docx import Document
-from docx.shared import RGBColor
-from docx.enum.text import WD_COLOR_INDEX
+import copy
 import os
+import re
+from functools import lru_cache
 
 from app.template_config import TRAINEE_TEMPLATE_NAME, JAIPUR_TEMPLATE_NAME, BANGALORE_TEMPLATE_NAME
 
 TRAINEE_TEMPLATE_FILENAME = TRAINEE_TEMPLATE_NAME
 
+# Matches {FieldName} placeholders; compiled once since it runs for every paragraph
+_PLACEHOLDER_RE = re.compile(r'\{([^}]+)\}')
+
+
+@lru_cache(maxsize=8)
+def _load_template_document(template_path, mtime_ns, size):
+    """Parse a template once per (path, mtime, size); callers deepcopy the result before filling."""
+    return Document(template_path)
+
+
+def _open_template(template_path):
+    stat = os.stat(template_path)
+    return copy.deepcopy(_load_template_document(template_path, stat.st_mtime_ns, stat.st_size))
+
 
 class OrdinalDateValue:
     """Date value rendered as e.g. 4th February' 26 with superscript ordinal suffix."""
@@ -586,8 +601,7 @@ class WordProcessor:
     ):
         if not (is_trainee_template or is_employment_address_template):
             return
-        import re
-        placeholders = re.findall(r'\{([^}]+)\}', original_text)
+        placeholders = _PLACEHOLDER_RE.findall(original_text)
         if not any(self._is_removable_address_line_placeholder(p) for p in placeholders):
             return
         if not paragraph.text.strip() and para_idx not in removal_list:
@@ -628,8 +642,6 @@ class WordProcessor:
         Find all placeholders in text and return a mapping of placeholder -> data_key.
         Uses case-insensitive and whitespace-normalized matching.
         """
-        import re
-        placeholder_pattern = r'\{([^}]+)\}'
         matches = {}
         
         # Create normalized data mapping: normalized_key -> (original_key, value)
@@ -643,7 +655,7 @@ class WordProcessor:
                 normalized_data[normalized_key] = (key, value)
         
         # Find all placeholders in text
-        found_placeholders = re.findall(placeholder_pattern, text)
+        found_placeholders = _PLACEHOLDER_RE.findall(text)
         for placeholder in found_placeholders:
             normalized_placeholder = self._normalize_key(placeholder)
             if normalized_placeholder in normalized_data:
@@ -675,7 +687,7 @@ class WordProcessor:
         )
         
         try:
-            doc = Document(template_path)
+            doc = _open_template(template_path)
         except Exception as e:
             raise Exception(f"Error opening template: {str(e)}")
         
@@ -687,6 +699,9 @@ class WordProcessor:
             for para_idx, paragraph in enumerate(doc.paragraphs):
                 # Store original text to check if paragraph only contains address placeholder
                 original_text = paragraph.text
+                if '{' not in original_text:
+                    # No placeholder here; skip the per-key scans, each of which rebuilds the text
+                    continue
                 
                 # First, try exact matches (for backward compatibility and performance)
                 for key, value in data.items():
@@ -737,6 +752,8 @@ class WordProcessor:
                         cell_paragraphs_to_remove = []
                         for para_idx, paragraph in enumerate(cell.paragraphs):
                             original_text = paragraph.text
+                            if '{' not in original_text:
+                                continue
                             
                             # First, try exact matches
                             for key, value in data.items():
@@ -0,0 +1,23 @@
+"""Scratch directories for the intermediate DOCX and PDF files of a conversion."""
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Generated DOCX/PDF files are transient, so keep them on RAM-backed storage when available
+FAST_TMPDIR = os.environ.get('RUNTIME_TMPDIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else None)
+FAST_TMPDIR_MIN_FREE = 256 * 1024 * 1024
+
+
+def make_work_dir(estimated_bytes: int = 0) -> str:
+    """Create a scratch directory, preferring FAST_TMPDIR when it has enough free space."""
+    if FAST_TMPDIR:
+        try:
+            required = max(estimated_bytes * 3, FAST_TMPDIR_MIN_FREE)
+            if shutil.disk_usage(FAST_TMPDIR).free > required:
+                return tempfile.mkdtemp(prefix='wordtopdf_', dir=FAST_TMPDIR)
+        except OSError as e:
+            logger.warning(f'Fast temp dir {FAST_TMPDIR} unavailable: {e}')
+    return tempfile.mkdtemp()
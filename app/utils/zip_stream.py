@@ -0,0 +1,274 @@
+"""Stream ZIP archives of generated PDFs straight into the HTTP response."""
+import functools
+import io
+import os
+import struct
+import tempfile
+import time
+import unicodedata
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from flask import Response, send_file, stream_with_context
+
+from app.utils.error_handler import ErrorHandler
+
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024
+# Build the archive in a temp file and let the WSGI server sendfile(2) it, instead of streaming
+# it through Python; trades time-to-first-byte for zero-copy sends (ZIP_SENDFILE=1)
+ZIP_SENDFILE = os.environ.get('ZIP_SENDFILE', '').lower() in ('1', 'true', 'yes')
+# PDFs barely shrink under DEFLATE, so archives are stored by default; ZIP_COMPRESSION=deflate
+# trades CPU for smaller downloads and compresses the files on ZIP_COMPRESS_WORKERS threads
+ZIP_COMPRESSION = (
+    zipfile.ZIP_DEFLATED if os.environ.get('ZIP_COMPRESSION', '').lower() == 'deflate' else zipfile.ZIP_STORED
+)
+ZIP_COMPRESS_WORKERS = int(os.environ.get('ZIP_COMPRESS_WORKERS', str(os.cpu_count() or 1)))
+ZIP_COMPRESS_LEVEL = 6
+# Shared by all downloads; each archive keeps at most a small window of files in flight
+_COMPRESS_POOL = ThreadPoolExecutor(max_workers=max(1, ZIP_COMPRESS_WORKERS), thread_name_prefix='zip-deflate')
+
+_CENTRAL_DIR_RECORD = struct.Struct('<4s4B4HL2L5H2L')
+_END_OF_CENTRAL_DIR = struct.Struct('<4s4H2LH')
+_UTF8_NAME_FLAG = 0x800
+
+
+class TransientFile(io.FileIO):
+    """Read-only file handle that deletes the file once the response closes it.
+
+    Flask skips ``call_on_close`` callbacks for ``send_file`` responses, so the
+    cleanup is tied to the file wrapper being closed by the WSGI server instead.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self._path = path
+
+    def close(self):
+        super().close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class _ZipChunkBuffer:
+    """
+    Write-only sink for ZipFile; without tell() zipfile streams entries with data descriptors.
+
+    Chunks are handed back as written rather than joined, so a file block read from disk
+    goes to the response without being copied again.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> List[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def stream_zip(
+    entries: Iterable[Tuple[str, str]],
+    summary_text: Optional[str] = None,
+    compression: int = ZIP_COMPRESSION,
+) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of (file_path, arcname) entries chunk by chunk.
+
+    Memory stays at one chunk regardless of the number of files.
+    """
+    yield from _iter_zip(entries, summary_text, compression)
+
+
+def _iter_zip(entries, summary_text, compression) -> Iterator[bytes]:
+    if compression == zipfile.ZIP_DEFLATED:
+        entries = list(entries)
+        if _fits_without_zip64(entries):
+            yield from _iter_deflated_zip(entries, summary_text)
+            return
+
+    sink = _ZipChunkBuffer()
+    with zipfile.ZipFile(sink, 'w', compression, allowZip64=True, strict_timestamps=False) as zip_file:
+        if summary_text:
+            # Text shrinks well, unlike the PDFs, so it is deflated even in a stored archive
+            zip_file.writestr('summary.txt', summary_text, compress_type=zipfile.ZIP_DEFLATED)
+        for file_path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(file_path, arcname, strict_timestamps=False)
+            info.compress_type = compression
+            with open(file_path, 'rb') as src, zip_file.open(info, 'w', force_zip64=True) as dest:
+                while True:
+                    block = src.read(ZIP_STREAM_CHUNK_SIZE)
+                    if not block:
+                        break
+                    dest.write(block)
+                    yield from sink.drain()
+    yield from sink.drain()
+
+
+def _fits_without_zip64(entries) -> bool:
+    # Deflate can grow incompressible data slightly, so leave headroom below the 4 GiB limit
+    total_size = sum(os.path.getsize(file_path) for file_path, _ in entries)
+    return len(entries) < 0xFFFF and total_size < zipfile.ZIP64_LIMIT // 2
+
+
+def _deflate_entry(file_path: str, arcname: str) -> Tuple[zipfile.ZipInfo, bytes]:
+    info = zipfile.ZipInfo.from_file(file_path, arcname, strict_timestamps=False)
+    with open(file_path, 'rb') as src:
+        # Read in blocks so only the compressed output, not the whole PDF, is held in memory
+        return _deflate_blocks(info, iter(lambda: src.read(ZIP_STREAM_CHUNK_SIZE), b''))
+
+
+def _deflate_blocks(info: zipfile.ZipInfo, blocks: Iterable[bytes]) -> Tuple[zipfile.ZipInfo, bytes]:
+    # zlib releases the GIL while compressing, so entries compress in parallel on threads
+    compressor = zlib.compressobj(ZIP_COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = []
+    crc = 0
+    file_size = 0
+    for block in blocks:
+        crc = zlib.crc32(block, crc)
+        file_size += len(block)
+        compressed.append(compressor.compress(block))
+    compressed.append(compressor.flush())
+    payload = b''.join(compressed)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.CRC = crc
+    info.file_size = file_size
+    info.compress_size = len(payload)
+    return info, payload
+
+
+def _iter_deflated_zip(entries, summary_text) -> Iterator[bytes]:
+    """
+    Write a DEFLATE archive from entries compressed ahead of time on a thread pool.
+
+    zipfile compresses one entry at a time, so the entries are compressed here and laid out
+    directly: each local header already carries the CRC and sizes, then the central directory.
+    Only used for archives that need no ZIP64 records.
+    """
+    written = []
+    offset = 0
+
+    def entry_bytes(info, payload):
+        nonlocal offset
+        info.header_offset = offset
+        header = info.FileHeader()
+        written.append(info)
+        offset += len(header) + len(payload)
+        return header, payload
+
+    if summary_text:
+        summary_info = zipfile.ZipInfo('summary.txt', date_time=time.localtime()[:6])
+        yield from entry_bytes(*_deflate_blocks(summary_info, [summary_text.encode('utf-8')]))
+
+    # Compress a bounded window ahead of the writer so memory stays at a few files
+    window = max(1, ZIP_COMPRESS_WORKERS) * 2
+    pending = deque()
+    try:
+        for file_path, arcname in entries:
+            pending.append(_COMPRESS_POOL.submit(_deflate_entry, file_path, arcname))
+            if len(pending) >= window:
+                yield from entry_bytes(*pending.popleft().result())
+        while pending:
+            yield from entry_bytes(*pending.popleft().result())
+    finally:
+        # A client that disconnects mid-download leaves queued files uncompressed
+        for future in pending:
+            future.cancel()
+
+    central_dir_offset = offset
+    central_dir = []
+    for info in written:
+        try:
+            filename, flag_bits = info.filename.encode('ascii'), info.flag_bits
+        except UnicodeEncodeError:
+            filename, flag_bits = info.filename.encode('utf-8'), info.flag_bits | _UTF8_NAME_FLAG
+        year, month, day, hour, minute, second = info.date_time
+        central_dir.append(_CENTRAL_DIR_RECORD.pack(
+            zipfile.stringCentralDir, zipfile.DEFAULT_VERSION, info.create_system,
+            zipfile.DEFAULT_VERSION, 0, flag_bits, zipfile.ZIP_DEFLATED,
+            hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day,
+            info.CRC, info.compress_size, info.file_size,
+            len(filename), 0, 0, 0, info.internal_attr, info.external_attr, info.header_offset,
+        ) + filename)
+    central_dir_size = sum(len(record) for record in central_dir)
+    central_dir.append(_END_OF_CENTRAL_DIR.pack(
+        zipfile.stringEndArchive, 0, 0, len(written), len(written), central_dir_size, central_dir_offset, 0,
+    ))
+    yield b''.join(central_dir)
+
+
+def attachment_disposition(download_name: str) -> dict:
+    """Content-Disposition header options matching what send_file emits for download_name."""
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    return {'filename': download_name}
+
+
+def zip_response(
+    entries: Iterable[Tuple[str, str]],
+    download_name: str,
+    summary_text: Optional[str] = None,
+    cleanup_paths: Tuple[str, ...] = (),
+    compression: int = ZIP_COMPRESSION,
+) -> Response:
+    """
+    Streaming attachment response for stream_zip; the first bytes go out before the archive is complete.
+
+    ``cleanup_paths`` are removed once the server closes the response, whether or not it was sent.
+    """
+    if ZIP_SENDFILE:
+        return _zip_file_response(entries, download_name, summary_text, cleanup_paths, compression)
+    response = Response(
+        stream_with_context(stream_zip(entries, summary_text, compression)),
+        mimetype='application/zip',
+    )
+    if cleanup_paths:
+        # Tied to the response rather than the generator: a generator closed before its first
+        # chunk never runs its finally, so a client leaving early would leak the work dirs
+        response.call_on_close(functools.partial(ErrorHandler.schedule_cleanup, *cleanup_paths))
+    response.headers.set('Content-Disposition', 'attachment', **attachment_disposition(download_name))
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx buffers proxied responses by default, which would hold the stream back until it ends
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _zip_file_response(entries, download_name, summary_text, cleanup_paths, compression) -> Response:
+    """Write the archive to a temp file and send it from disk; the file is deleted once sent."""
+    zip_fd, zip_path = tempfile.mkstemp(suffix='.zip')
+    try:
+        with os.fdopen(zip_fd, 'wb') as zip_handle:
+            for chunk in _iter_zip(entries, summary_text, compression):
+                zip_handle.write(chunk)
+    except Exception:
+        os.remove(zip_path)
+        raise
+    finally:
+        if cleanup_paths:
+            ErrorHandler.schedule_cleanup(*cleanup_paths)
+
+    response = send_file(
+        TransientFile(zip_path),
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='application/zip',
+        max_age=0,
+        etag=False,
+        conditional=False,
+    )
+    response.content_length = os.path.getsize(zip_path)
+    return response
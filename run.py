@@ -1,6 +1,5 @@
 from app import create_app
 
-app = create_app()
-
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    app = create_app()
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -170,6 +170,17 @@ class TestErrorHandler(unittest.TestCase):
         self.assertFalse(os.path.exists(test_file1))
         self.assertFalse(os.path.exists(test_file2))
     
+    def test_cleanup_success_logged_after_deletion(self):
+        """Test cleanup logs scheduling first and success only once deleted"""
+        with self.assertLogs('app.utils.error_handler', level='INFO') as logs:
+            ErrorHandler.cleanup_temp_files(self.temp_dir)
+            self.assertIn(f"Temp directory scheduled for cleanup: {self.temp_dir}", logs.output[0])
+            deadline = time.time() + 5
+            while len(logs.output) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+
+        self.assertIn(f"Cleaned up temp directory: {self.temp_dir}", logs.output[1])
+    
     def test_handle_conversion_error(self):
         """Test conversion error handling"""
         test_error = ValueError("Conversion failed")
@@ -230,7 +241,36 @@ class TestConversionManager(unittest.TestCase):
         
         self.assertEqual(self.conversion_manager.conversion_progress['status'], 'stopped')
         self.assertTrue(self.conversion_manager._stop_conversion)
-    
+
+    def test_fail(self):
+        """Test failure publishes status and error together"""
+        self.conversion_manager.update_progress(2, 5, "Converting...")
+        before = self.conversion_manager.conversion_progress
+
+        self.conversion_manager.fail("No valid files found")
+
+        progress = self.conversion_manager.conversion_progress
+        self.assertIsNot(progress, before)
+        self.assertEqual(progress['status'], 'error')
+        self.assertEqual(progress['error'], "No valid files found")
+        self.assertEqual(progress['current'], 2)
+
+    def test_single_file_runtime_error_is_not_a_stop(self):
+        """Test a RuntimeError without a stop request is reported as a failure"""
+        file_path = os.path.join(self.temp_dir, 'letter.docx')
+        with open(file_path, 'wb') as f:
+            f.write(b'docx')
+
+        with patch.object(self.conversion_manager, '_cached_libreoffice_path', return_value='soffice'), \
+             patch('app.utils.conversion_manager.convert_docx_files_to_pdf',
+                   side_effect=RuntimeError("can't start new thread")):
+            _, _, error = self.conversion_manager.convert_single_file(file_path, 'letter.docx', self.temp_dir)
+            self.assertIn('Conversion failed for letter.docx', error)
+
+            self.conversion_manager.stop_conversion()
+            _, _, error = self.conversion_manager.convert_single_file(file_path, 'letter.docx', self.temp_dir)
+            self.assertEqual(error, 'Conversion of letter.docx was stopped')
+
     def test_validate_conversion_requirements(self):
         """Test conversion requirements validation"""
         is_ready, errors = self.conversion_manager.validate_conversion_requirements()
@@ -254,9 +294,147 @@ class TestConversionManager(unittest.TestCase):
         self.assertIsInstance(stats['estimated_remaining'], (int, float))
         self.assertIsInstance(stats['progress_percentage'], (int, float))
 
+class TestDocxPool(unittest.TestCase):
+    """Test the shared DOCX process pool"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_pool_worker_does_not_create_app(self):
+        """Test a worker re-importing a run.py-style launcher does not build the app again"""
+        import subprocess
+        import sys
+
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        marker = os.path.join(self.temp_dir, 'create_app_calls')
+        launcher = os.path.join(self.temp_dir, 'launcher.py')
+        with open(launcher, 'w') as f:
+            f.write(
+                'import os, sys\n'
+                f'sys.path.insert(0, {repo_root!r})\n'
+                'import app\n'
+                'def create_app():\n'
+                f'    with open({marker!r}, "a") as f:\n'
+                '        f.write(f"{os.getpid()}\\n")\n'
+                'app.create_app = create_app\n'
+                'from run import *\n'
+                'if __name__ == "__main__":\n'
+                '    from app.utils.docx_pool import get_docx_pool\n'
+                '    print(get_docx_pool().submit(os.getpid).result())\n'
+            )
+
+        result = subprocess.run(
+            [sys.executable, launcher], cwd=self.temp_dir, capture_output=True, text=True, timeout=120
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        worker_pid = result.stdout.split()[-1]
+        calls = open(marker).read().split() if os.path.exists(marker) else []
+        self.assertNotIn(worker_pid, calls)
+
+class TestWarmServerFallback(unittest.TestCase):
+    """Test the warm LibreOffice path hands off to soffice processes"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_busy_pool_falls_back_to_soffice(self):
+        """Test a request finding every warm instance busy converts with soffice instead"""
+        from app.utils import lo_server
+        from app.utils.libreoffice_helper import convert_docx_files_to_pdf
+
+        docx_path = os.path.join(self.temp_dir, 'letter.docx')
+        with open(docx_path, 'wb') as f:
+            f.write(b'docx')
+        finished = Mock(returncode=0)
+        finished.poll.return_value = 0
+
+        busy = []
+        while not lo_server._idle_instances.empty():
+            busy.append(lo_server._idle_instances.get())
+        try:
+            with patch.object(lo_server, 'is_server_running', return_value=True), \
+                 patch.object(lo_server, 'UNOSERVER_ACQUIRE_TIMEOUT', 0.1), \
+                 patch('app.utils.libreoffice_helper.get_soffice_path', return_value='soffice'), \
+                 patch('app.utils.libreoffice_helper._start_soffice', return_value=finished) as start_soffice:
+                started = time.time()
+                convert_docx_files_to_pdf([docx_path], self.temp_dir, timeout=30)
+        finally:
+            for instance in busy:
+                lo_server._idle_instances.put(instance)
+
+        self.assertLess(time.time() - started, 5)
+        start_soffice.assert_called_once()
+        self.assertIn(docx_path, start_soffice.call_args[0][0])
+
+    def test_stalled_call_returns_on_socket_timeout(self):
+        """Test a stalled XML-RPC call ends on its own socket timeout"""
+        import queue
+        import threading
+        from xmlrpc.server import SimpleXMLRPCServer
+        from app.utils import lo_server
+
+        server = SimpleXMLRPCServer(('127.0.0.1', 0), logRequests=False, allow_none=True)
+        server.register_function(lambda *args: time.sleep(3), 'convert')
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        instance = Mock(port=server.server_address[1], conversions=0)
+        idle = queue.Queue()
+        idle.put(instance)
+        try:
+            with patch.object(lo_server, 'UNOSERVER_HOST', '127.0.0.1'), \
+                 patch.object(lo_server, 'UNOSERVER_CONVERT_TIMEOUT', 0.5), \
+                 patch.object(lo_server, '_idle_instances', idle):
+                started = time.time()
+                with self.assertRaises(TimeoutError):
+                    lo_server.convert_with_server(['letter.docx'], self.temp_dir, timeout=30)
+                elapsed = time.time() - started
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertLess(elapsed, 2.5)
+        instance.restart.assert_called_once()
+        self.assertIs(idle.get_nowait(), instance)
+
+class TestProgressPublishing(unittest.TestCase):
+    """Test progress updates published for lock-free /progress reads"""
+
+    def test_file_statuses_published_as_new_dict(self):
+        """Test a file status update replaces the files dict instead of writing into it"""
+        from app import routes
+
+        state = routes._create_progress_state('00000000-0000-0000-0000-000000000001')
+        before = state['files']
+        with routes.conversion_progress_lock:
+            routes._apply_progress(state, 1, 2, 'Converting...', {'a.pdf': ('done', 1)}, 2)
+
+        self.assertEqual(before, {})
+        self.assertIsNot(state['files'], before)
+        self.assertEqual(state['files']['a.pdf']['status'], 'done')
+
 class TestSecurityEdgeCases(unittest.TestCase):
     """Test security edge cases and vulnerabilities"""
     
+    def test_upload_signature_and_size_read_in_one_pass(self):
+        """Test uploads are sniffed and sized together and left rewound"""
+        from app.utils.file_security import FileSecurity
+
+        docx = FileStorage(stream=io.BytesIO(b'PK\x03\x04' + b'\x00' * 100), filename='letter.docx')
+        is_valid, error_msg, valid_files = FileSecurity.validate_file_upload([docx])
+        self.assertTrue(is_valid, error_msg)
+        self.assertEqual(valid_files[0].stream.tell(), 0)
+
+        fake = FileStorage(stream=io.BytesIO(b'not an office file'), filename='letter.docx')
+        is_valid, error_msg, _ = FileSecurity.validate_file_upload([fake])
+        self.assertFalse(is_valid)
+        self.assertIn('valid Office document', error_msg)
+    
     def test_path_traversal_prevention(self):
         """Test prevention of path traversal attacks"""
         malicious_filenames = [
@@ -339,6 +517,71 @@ class TestErrorRecovery(unittest.TestCase):
         self.assertIn("error", error_dict)
         self.assertIn("timed out", error_dict["error"])
 
+class TestRowRecordFormatting(unittest.TestCase):
+    """Test column-wise formatting of Excel rows"""
+    
+    def test_date_column_matches_per_cell_formatting(self):
+        """Test vectorised date formatting gives the same values as format_date_field"""
+        from app.routes import _format_ordinal_date_series, format_date_field
+        
+        values = ['2026-02-04', '13/04/2026', '4 February 2026', 'junk', '', None,
+                  pd.Timestamp('2026-03-01'), 45000]
+        expected = [format_date_field('' if pd.isna(v) else v, 'Date of Joining') for v in values]
+        actual = _format_ordinal_date_series(pd.Series(values, dtype=object))
+        
+        def as_tuple(value):
+            if hasattr(value, 'ordinal_suffix'):
+                return (value.day, value.ordinal_suffix, value.month_year_text)
+            return value
+        
+        self.assertEqual([as_tuple(v) for v in actual], [as_tuple(v) for v in expected])
+
+class TestZipStream(unittest.TestCase):
+    """Test streamed ZIP archives"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_parallel_deflate_archive_is_valid(self):
+        """Test entries compressed on the thread pool form a readable archive"""
+        import zipfile
+        from app.utils.zip_stream import stream_zip
+
+        entries = []
+        for i in range(5):
+            path = os.path.join(self.temp_dir, f'letter{i}.pdf')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(512) + b'%PDF' * 1000 * i)
+            entries.append((path, f'Letters/Lëtter {i}.pdf'))
+
+        data = b''.join(stream_zip(entries, 'summary', compression=zipfile.ZIP_DEFLATED))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.read('summary.txt'), b'summary')
+            for path, arcname in entries:
+                with open(path, 'rb') as f:
+                    self.assertEqual(archive.read(arcname), f.read())
+
+    def test_cleanup_runs_when_closed_before_first_chunk(self):
+        """Test work dirs are cleaned up when the response closes unread"""
+        from flask import Flask
+        from app.utils.zip_stream import zip_response
+
+        path = os.path.join(self.temp_dir, 'letter.pdf')
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+
+        with Flask(__name__).test_request_context(), \
+             patch('app.utils.zip_stream.ErrorHandler.schedule_cleanup') as schedule_cleanup:
+            response = zip_response([(path, 'letter.pdf')], 'letters.zip', cleanup_paths=(self.temp_dir,))
+            schedule_cleanup.assert_not_called()
+            response.close()
+
+        schedule_cleanup.assert_called_once_with(self.temp_dir)
+
 if __name__ == '__main__':
     # Run the tests
     unittest.main(verbosity=2) 
\ No newline at end of file